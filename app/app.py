@@ -1,18 +1,31 @@
+from __future__ import annotations
+
 import logging
+import os
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from app.planning import ExecutionPlan, ExecutionPlanner, MAP_SIMPLIFIED, MAP_SKIPPED, MAP_STOPS_ONLY, WINDOWED, \
+    get_memory_budget, record_peak, reset_peak
+from sdk.moveapps_spec import hook_impl
 
-import folium
-import pandas as pd
-from geopandas import GeoDataFrame
-from movingpandas import TrajectoryCollection, TrajectoryStopDetector, Trajectory
-from movingpandas import trajectory_utils
-from movingpandas.spatiotemporal_utils import TRange
+# The geospatial dependencies (pandas, geopandas, movingpandas, folium) are imported where they are used.
+# Importing the App and validating its configuration stays cheap, folium is only loaded when a map gets plotted.
+if TYPE_CHECKING:
+    from geopandas import GeoDataFrame
+    from movingpandas import TrajectoryCollection, Trajectory
+    from numpy import ndarray
+    from pandas import DataFrame, Timestamp
 
-from pandas import Timestamp
+# columns of the stop points returned by the movingpandas stop detector
+STOP_POINT_COLUMNS = ['geometry', 'start_time', 'end_time', 'traj_id', 'duration_s']
 
-from sdk.moveapps_spec import hook_impl
+# distance column of the segments after the stops
+DISTANCE_COLUMN = 'distance (m)'
+
+# file formats of the stop summary artifact ("none" writes no file)
+STOP_SUMMARY_FORMATS = ["csv", "parquet", "none"]
 
 
 @dataclass
@@ -32,6 +45,12 @@ class AppConfig:
     # The output data returned from app at completion ("input_data" or "trajectories")
     return_data: str
 
+    # The file format of the per trajectory stop summary artifact ("csv", "parquet" or "none")
+    stop_summary_format: str = "csv"
+
+    # The memory budget of a run in megabytes, overrides the APP_MEMORY_BUDGET_MB environment variable
+    memory_budget_mb: Optional[float] = None
+
     def __post_init__(self):
         """ Ensures AppConfig was initialized with valid values.
         """
@@ -41,6 +60,38 @@ class AppConfig:
         assert self.display_trajectories_after_stops is not None and \
                self.display_trajectories_after_stops in [True, False]
         assert self.return_data in ["input_data", "trajectories"]
+        assert self.stop_summary_format in STOP_SUMMARY_FORMATS
+        assert self.memory_budget_mb is None or self.memory_budget_mb > 0
+
+
+@dataclass
+class SegmentRange:
+    """ A segment after a stop as it is drawn on the map: the observations of its trajectory from the start of the
+    stop on. The segments of a trajectory share its coordinates, a segment is only cut from them when it is drawn.
+    """
+    # id of the segment, the id movingpandas gives the segment trajectory (see get_stop_to_end_trajectory())
+    segment_id: str
+
+    # coordinates of all observations of the trajectory, in the working CRS
+    coordinates: ndarray
+
+    # position of the first observation of the segment in the trajectory
+    start: int = 0
+
+    def __len__(self) -> int:
+        return len(self.coordinates) - self.start
+
+    def get_coordinates(self, step: int = 1) -> ndarray:
+        """ Cuts the coordinates of the segment from the coordinates of its trajectory.
+        :param step: keeps every n-th observation and the last one, for simplified maps
+        :return: the coordinates of the observations of the segment
+        """
+        import numpy as np
+
+        coordinates = self.coordinates[self.start:]
+        if step > 1:
+            coordinates = np.concatenate([coordinates[:-1:step], coordinates[-1:]])
+        return coordinates
 
 
 class App(object):
@@ -51,14 +102,66 @@ class App(object):
         """
         self.moveapps_io = moveapps_io
 
-        self.all_stop_points = GeoDataFrame()
-        self.final_stop_points = GeoDataFrame()
+        # results of a run, see reset() and release()
+        self.all_stop_points: Optional[GeoDataFrame] = None
+        self.final_stop_points: Optional[GeoDataFrame] = None
+        self.stop_summary: Optional[DataFrame] = None
+
+        # stops of the trajectories analyzed so far, combined once all trajectories are analyzed, see collect_stops()
+        self.collected_stops: List[GeoDataFrame] = []
+        self.collected_final_stops: List[GeoDataFrame] = []
 
+        # segments after the stops, only materialized if they are the output data (return_data "trajectories")
         self.trajectories_after_all_stops: List[Trajectory] = []
         self.trajectories_after_final_stop: List[Trajectory] = []
 
+        # segments after the stops drawn on the map, only kept if display_trajectories_after_stops is set
+        self.map_segments: List[SegmentRange] = []
+
+        # CRS of the input data and CRS the stops are detected in, see normalize_crs()
+        self.crs = None
+        self.working_crs = None
+        # CRS of the stop tables: the working CRS, or the CRS of the input data for merged csv artifacts
+        self.stops_crs = None
+
+        # how the run is executed within the memory budget, see plan_execution()
+        self.execution_plan: Optional[ExecutionPlan] = None
+
         self.app_config = self.map_config({})  # default configuration
 
+    def release(self) -> None:
+        """ Releases the results of the last run. Caches shared between runs are kept. """
+        self.all_stop_points = None
+        self.final_stop_points = None
+        self.stop_summary = None
+
+        self.collected_stops = []
+        self.collected_final_stops = []
+
+        self.trajectories_after_all_stops = []
+        self.trajectories_after_final_stop = []
+        self.map_segments = []
+
+        self.crs = None
+        self.working_crs = None
+        self.stops_crs = None
+        self.execution_plan = None
+
+    def reset(self) -> None:
+        """ Resets the results before a run. """
+        from geopandas import GeoDataFrame
+
+        self.all_stop_points = GeoDataFrame()
+        self.final_stop_points = GeoDataFrame()
+        self.stop_summary = None
+
+        self.collected_stops = []
+        self.collected_final_stops = []
+
+        self.trajectories_after_all_stops = []
+        self.trajectories_after_final_stop = []
+        self.map_segments = []
+
     @staticmethod
     def map_config(config: dict) -> AppConfig:
         """ Maps a configuration dictionary to an App Config object.
@@ -70,7 +173,9 @@ class App(object):
             max_diameter_meters=config.get('max_diameter_meters', 100),
             final_stops_only=config.get("final_stops_only", True),
             display_trajectories_after_stops=config.get("display_trajectories_after_stops", True),
-            return_data=config.get("return_data", "input_data")
+            return_data=config.get("return_data", "input_data"),
+            stop_summary_format=config.get("stop_summary_format", "csv"),
+            memory_budget_mb=config.get("memory_budget_mb")
         )
 
     @staticmethod
@@ -80,77 +185,306 @@ class App(object):
         :param stop_end_time: the time that the last stop ended
         :return: the trajectory segment between the stop end time and the final observation
         """
+        from movingpandas import trajectory_utils
+        from movingpandas.spatiotemporal_utils import TRange
+
         final_observation_time = traj.df.index.max()
         time_range = [TRange(stop_end_time, final_observation_time)]
-        if len(trajectory_utils.convert_time_ranges_to_segments(traj, time_range)) >= 1:
-            return trajectory_utils.convert_time_ranges_to_segments(traj, time_range)[0]
+        segments = trajectory_utils.convert_time_ranges_to_segments(traj, time_range)
+        if len(segments) >= 1:
+            return segments[0]
         return None
 
-    def add_stop_data(self, stop: GeoDataFrame, trajectory) -> Optional[Trajectory]:
+    @staticmethod
+    def get_movement(trajectory: Trajectory) -> DataFrame:
+        """ Gets the speed and distance of each observation of a trajectory.
+        The segments after the stops are parts of the trajectory: their movement is taken from it instead of
+        computing it for every segment.
+        :param trajectory: the trajectory (in the working CRS)
+        :return: the speed (m/s) and the distance (m) from the previous observation, indexed by time
+        """
+        # not kept in the trajectory, it is part of the input data (and of the output data of "input_data" runs)
+        speed_position = trajectory.df.columns.get_loc("speed") if "speed" in trajectory.df else None
+        input_speeds = trajectory.df.pop("speed") if speed_position is not None else None
+        trajectory.add_speed(overwrite=True, units=("m", "s"))
+        trajectory.add_distance(overwrite=True, name=DISTANCE_COLUMN, units="m")
+        distances = trajectory.df.pop(DISTANCE_COLUMN)
+        movement = distances.to_frame().assign(speed=trajectory.df.pop("speed"))
+        if input_speeds is not None:
+            trajectory.df.insert(speed_position, "speed", input_speeds)
+        return movement
+
+    @staticmethod
+    def get_segment_movement(movement: DataFrame, start: int) -> DataFrame:
+        """ Gets the speed and distance of each observation of a segment, as `add_speed()` and `add_distance()`
+        would compute them on the segment.
+        :param movement: the movement of the trajectory, see get_movement()
+        :param start: the position of the first observation of the segment in the trajectory
+        :return: the speed (m/s) and the distance (m) from the previous observation in the segment, indexed by time
+        """
+        import pandas as pd
+
+        distances = movement[DISTANCE_COLUMN].to_numpy()[start:].copy()
+        distances[0] = 0  # no previous observation in the segment
+        speeds = movement["speed"].to_numpy()[start:].copy()
+        speeds[0] = speeds[1]  # the speed of the first observation is the speed of the second one
+        return pd.DataFrame({DISTANCE_COLUMN: distances, "speed": speeds}, index=movement.index[start:])
+
+    def add_stop_data(self, stop: GeoDataFrame, trajectory, movement: Optional[DataFrame] = None,
+                      coordinates: Optional[ndarray] = None) -> Optional[Trajectory]:
         """ Add data for stop and segment after stop.
+        The segment after the stop is only materialized if it is part of the output data, its movement is computed
+        from the movement of the trajectory and the map only keeps its position in the trajectory.
         :param stop: the stop point to analyze
         :param trajectory: the trajectory that the stop point is part of
+        :param movement: the movement of the trajectory (see get_movement()), computed if not given
+        :param coordinates: the coordinates of the trajectory for the map, computed if not given
+        :return: the segment after the stop if it is part of the output data
         """
+        import pandas as pd
+        import shapely
+
         # check if there is further movement after the final stop point
-        final_observation_time = Timestamp(trajectory.df.index.max())
+        final_observation_time = pd.Timestamp(trajectory.df.index.max())
         stop['final_observation_time'] = final_observation_time
 
         time_tracked_since_stop = final_observation_time - stop.start_time.iloc[0]
         stop['time_tracked_since_stop_began'] = time_tracked_since_stop
 
-        # mean_rate_all_tracks
-        trajectory.crs_units = trajectory.df.crs.axis_info[0].unit_name
-        trajectory.add_speed(overwrite=True, units=("m", "s"))
-        stop['mean_rate_all_tracks'] = trajectory.df["speed"].mean()
-
-        segment: Optional[Trajectory] = self.get_stop_to_end_trajectory(trajectory, stop.start_time.iloc[0])
+        if movement is None:
+            movement = self.get_movement(trajectory)
 
-        # movement after final stop
-        if segment is not None:
-            segment.add_distance(overwrite=True, name="distance (m)", units="m")
-            stop['distance_traveled_since_stop_began'] = segment.df['distance (m)'].sum()
-            segment.add_speed(overwrite=True, units=("m", "s"))
-            stop['average_rate_since_stop_began'] = segment.df.speed.mean()
-            self.trajectories_after_all_stops.append(segment)
+        # mean_rate_all_tracks
+        stop['mean_rate_all_tracks'] = movement["speed"].mean()
+
+        # the segment after the stop: the observations from the start of the stop on
+        start_time = stop.start_time.iloc[0]
+        start = int(trajectory.df.index.searchsorted(start_time))
+        segment: Optional[Trajectory] = None
+
+        # movement after final stop (a segment has at least two observations)
+        if len(trajectory.df) - start >= 2:
+            segment_movement = self.get_segment_movement(movement, start)
+            stop['distance_traveled_since_stop_began'] = segment_movement[DISTANCE_COLUMN].sum()
+            stop['average_rate_since_stop_began'] = segment_movement["speed"].mean()
+            if self.app_config.return_data == "trajectories":
+                segment = self.get_stop_to_end_trajectory(trajectory, start_time)
+                segment.df["speed"] = segment_movement["speed"].to_numpy()
+                segment.df[DISTANCE_COLUMN] = segment_movement[DISTANCE_COLUMN].to_numpy()
+                self.trajectories_after_all_stops.append(segment)
+            if self.app_config.display_trajectories_after_stops:
+                if coordinates is None:
+                    coordinates = shapely.get_coordinates(trajectory.df[trajectory.get_geom_col()].values)
+                self.map_segments.append(SegmentRange(f"{trajectory.id}_{start_time}", coordinates, start))
         else:
             # no final segment after stop
             stop['distance_traveled_since_stop_began'] = 0
             stop['average_rate_since_stop_began'] = 0
 
-        self.all_stop_points = pd.concat([self.all_stop_points, stop])
+        self.collected_stops.append(stop)
         return segment
 
-    def get_stops(self, trajectory: Trajectory) -> None:
-        """ Gets the stop point(s) based on configuration params and the trajectory.
+    def detect_stops(self, trajectory: Trajectory) -> GeoDataFrame:
+        """ Detects the stop points of a trajectory based on configuration params.
         :param trajectory: the trajectory to check for stop detections
+        :return: the detected stop points (only the final one if `final_stops_only` is set)
         """
+        from app.stop_detection import FinalStopDetector, StopDetector
+
         time_col_name = trajectory.to_point_gdf().index.name
         trajectory.df.sort_values(by=[time_col_name], ascending=False)
 
-        detector = TrajectoryStopDetector(trajectory)
-        stop_points = detector.get_stop_points(min_duration=timedelta(hours=self.app_config.min_duration_hours),
-                                               max_diameter=self.app_config.max_diameter_meters)
+        # only the final stop is needed: search it backwards from the last observation
+        detector = FinalStopDetector(trajectory) if self.app_config.final_stops_only \
+            else StopDetector(trajectory)
+        return detector.get_stop_points(min_duration=timedelta(hours=self.app_config.min_duration_hours),
+                                        max_diameter=self.app_config.max_diameter_meters)
 
+    def add_stops(self, stop_points: GeoDataFrame, trajectory: Trajectory) -> None:
+        """ Adds the data of the detected stop point(s) of a trajectory.
+        :param stop_points: the stop points detected in the trajectory
+        :param trajectory: the trajectory the stop points are part of
+        """
         if not stop_points.empty:
             # sort by end time
             stop_points.sort_values(by=['end_time'], ascending=True)
 
+            import shapely
+
+            # computed once for all stops of the trajectory
+            movement = self.get_movement(trajectory)
+            coordinates = shapely.get_coordinates(trajectory.df[trajectory.get_geom_col()].values) \
+                if self.app_config.display_trajectories_after_stops else None
+
             if not self.app_config.final_stops_only:
                 # get all stop points besides the final one
                 for i in range(len(stop_points) - 1):
                     stop = stop_points.iloc[[i]].copy()
-                    self.add_stop_data(stop, trajectory)
+                    self.add_stop_data(stop, trajectory, movement, coordinates)
 
             # get final stop and final segment if it exists
             final_stop: GeoDataFrame = stop_points.iloc[[-1]].copy()
-            final_segment = self.add_stop_data(final_stop, trajectory)
+            final_segment = self.add_stop_data(final_stop, trajectory, movement, coordinates)
 
             # add to list of final stop points
-            self.final_stop_points = pd.concat([self.final_stop_points, final_stop])
+            self.collected_final_stops.append(final_stop)
 
             if final_segment is not None:
                 self.trajectories_after_final_stop.append(final_segment)
 
+    def collect_stops(self) -> None:
+        """ Combines the stops collected from all trajectories into the stop tables, with a single concatenation.
+        """
+        import pandas as pd
+
+        if self.collected_stops:
+            self.all_stop_points = pd.concat(self.collected_stops)
+        if self.collected_final_stops:
+            self.final_stop_points = pd.concat(self.collected_final_stops)
+        self.collected_stops = []
+        self.collected_final_stops = []
+
+    @staticmethod
+    def summarize_stops(stop_points: GeoDataFrame, traj_ids: List) -> DataFrame:
+        """ Summarizes the stops of each trajectory with a single grouped pass over the stop table.
+        :param stop_points: the stop points with their stop data, see add_stop_data()
+        :param traj_ids: the ids of all analyzed trajectories, trajectories without stops are summarized as well
+        :return: the summary of each trajectory, indexed by traj_id
+        """
+        import pandas as pd
+
+        aggregations = dict(
+            stop_count=('duration_s', 'size'),
+            total_duration_s=('duration_s', 'sum'),
+            max_duration_s=('duration_s', 'max'),
+            final_stop_start_time=('start_time', 'last'),
+            final_stop_end_time=('end_time', 'last'),
+            final_observation_time=('final_observation_time', 'last'),
+            distance_since_final_stop_began_m=('distance_traveled_since_stop_began', 'last')
+        )
+        if stop_points.empty:
+            # no stops in any trajectory (the stop table has no columns)
+            stops = pd.DataFrame({'traj_id': pd.Series(dtype=object),
+                                  'duration_s': pd.Series(dtype=float),
+                                  'start_time': pd.Series(dtype='datetime64[ns]'),
+                                  'end_time': pd.Series(dtype='datetime64[ns]'),
+                                  'final_observation_time': pd.Series(dtype='datetime64[ns]'),
+                                  'distance_traveled_since_stop_began': pd.Series(dtype=float)})
+        else:
+            # the final stop of a trajectory is its last stop in time
+            stops = pd.DataFrame(stop_points.drop(columns='geometry')).sort_values(by=['end_time'], kind='stable')
+        summary = stops.groupby('traj_id', sort=False).agg(**aggregations)
+
+        summary = summary.reindex(pd.Index(traj_ids, name='traj_id'))
+        summary['stop_count'] = summary['stop_count'].fillna(0).astype(int)
+        summary['total_duration_s'] = summary['total_duration_s'].fillna(0).astype(float)
+        summary['time_since_final_stop_began_s'] = \
+            (summary['final_observation_time'] - summary['final_stop_start_time']).dt.total_seconds()
+        return summary
+
+    def write_stop_summary(self) -> None:
+        """ Writes the stop summary artifact in the configured format. """
+        if self.app_config.stop_summary_format == "csv":
+            self.stop_summary.to_csv(self.moveapps_io.create_artifacts_file('stop_summary.csv'))
+        elif self.app_config.stop_summary_format == "parquet":
+            self.stop_summary.to_parquet(self.moveapps_io.create_artifacts_file('stop_summary.parquet'))
+
+    def get_stops(self, trajectory: Trajectory) -> None:
+        """ Gets the stop point(s) based on configuration params and the trajectory.
+        :param trajectory: the trajectory to check for stop detections
+        """
+        self.add_stops(self.detect_stops(trajectory), trajectory)
+
+    def normalize_crs(self, data: TrajectoryCollection, windowed: bool = False) -> Iterator[Trajectory]:
+        """ Prepares the trajectories of a collection for the stop detection.
+        Projected data is transformed into the working CRS with a single transformation of the whole collection,
+        geographic data is analyzed as it is. The CRS of the input data is kept for the outputs.
+        :param data: the collection of trajectories to analyze
+        :param windowed: transform one trajectory at a time, only one transformed trajectory is kept in memory
+        :return: the trajectories in the working CRS
+        """
+        from app.crs import WORKING_CRS, transform_trajectories
+
+        trajectories = data.trajectories
+        self.set_crs(data)
+        if self.crs != self.working_crs:
+            logging.info(f'Transforming {len(trajectories)} trajectories from {self.crs.name} to {WORKING_CRS}')
+            if windowed:
+                trajectories = (transform_trajectories([tr], self.crs, WORKING_CRS)[0] for tr in trajectories)
+            else:
+                trajectories = transform_trajectories(trajectories, self.crs, WORKING_CRS)
+        return self.__with_crs_units(trajectories)
+
+    def set_crs(self, data: TrajectoryCollection) -> None:
+        """ Sets the CRS of the input data and the working CRS the stops are detected in.
+        :param data: the collection of trajectories to analyze
+        """
+        from app.crs import WORKING_CRS, is_working_crs
+
+        self.crs = data.trajectories[0].df.crs if data.trajectories else None
+        self.working_crs = self.crs if is_working_crs(self.crs) else WORKING_CRS
+
+    @staticmethod
+    def __with_crs_units(trajectories: Iterable[Trajectory]) -> Iterator[Trajectory]:
+        for tr in trajectories:
+            # may be missing on trajectories created by older movingpandas versions
+            tr.crs_units = tr.df.crs.axis_info[0].unit_name if tr.df.crs is not None else None
+            yield tr
+
+    def plan_execution(self, data: TrajectoryCollection) -> ExecutionPlan:
+        """ Plans the run within the memory budget (of the app configuration or the environment).
+        :param data: the collection of trajectories to analyze
+        :return: the plan, the map is planned once the stops are detected
+        """
+        from app.crs import is_working_crs
+
+        trajectories = data.trajectories
+        point_counts = [len(tr.df) for tr in trajectories]
+        total = sum(point_counts)
+        bytes_per_point = sum(tr.df.memory_usage(deep=False).sum() for tr in trajectories) / total if total else 0
+
+        planner = ExecutionPlanner(get_memory_budget(self.app_config.memory_budget_mb))
+        plan = planner.plan(point_counts, bytes_per_point,
+                            transform=not is_working_crs(trajectories[0].df.crs if trajectories else None))
+        # the run starts with the plan, its peak memory is measured from here
+        plan.peak_of_run = reset_peak()
+        logging.info(f'Execution plan for {total} observations of {len(trajectories)} trajectories: {plan}')
+        return plan
+
+    def plan_map(self) -> None:
+        """ Plans the segments after the detected stops and the map within the memory left by the stop detection.
+        """
+        if self.execution_plan is None:
+            return
+        planner = ExecutionPlanner(self.execution_plan.budget_bytes)
+        stops = self.final_stop_points if self.app_config.final_stops_only else self.all_stop_points
+        segments = self.trajectories_after_final_stop if self.app_config.final_stops_only \
+            else self.trajectories_after_all_stops
+        # the segments of a trajectory share its coordinates
+        trajectory_coordinates = {id(segment.coordinates): segment.coordinates for segment in self.map_segments}
+        planner.plan_segments(self.execution_plan, sum(len(segment.df) for segment in segments),
+                              sum(len(coordinates) for coordinates in trajectory_coordinates.values()))
+        planner.plan_map(self.execution_plan, len(stops), sum(len(segment) for segment in self.map_segments))
+        logging.info(f'Execution plan with map: {self.execution_plan}')
+
+    def to_output_crs(self, stop_points: GeoDataFrame) -> GeoDataFrame:
+        """ Transforms stop points from the CRS of the stop tables back into the CRS of the input data.
+        :param stop_points: the stop points of a stop table
+        :return: the stop points in the CRS of the input data
+        """
+        from app.crs import transform_stop_points
+
+        if self.crs == self.stops_crs or stop_points.empty:
+            return stop_points
+        return transform_stop_points(stop_points, self.stops_crs, self.crs)
+
+    @hook_impl
+    def validate_config(self, config: dict) -> None:
+        """ Validates the configuration before the input data gets loaded.
+        :param config: the app configuration settings
+        """
+        self.map_config(config)
+
     @hook_impl
     def execute(self, data: TrajectoryCollection, config: dict) -> TrajectoryCollection:
         """ Executes the application.
@@ -160,44 +494,233 @@ class App(object):
         """
         logging.info(f'Running Stop Detection app on {len(data.trajectories)} trajectories with {config}')
         self.app_config = self.map_config(config)  # override with user input
+        self.reset()
+        self.execution_plan = self.plan_execution(data)
 
         # iterate through trajectories and look for stops
-        for tr in data.trajectories:
+        for tr in self.normalize_crs(data, windowed=self.execution_plan.strategy == WINDOWED):
             self.get_stops(tr)
+        self.stops_crs = self.working_crs
 
-        self.generate_plot(track_id_col=data.get_traj_id_col())
+        return self.create_outputs(data)
 
-        # write csv output files
-        self.final_stop_points.to_csv(self.moveapps_io.create_artifacts_file('final_stops.csv'))
+    def execute_batch(self, runs: Iterable[Tuple[TrajectoryCollection, dict, str]]) -> List[TrajectoryCollection]:
+        """ Executes the application for many data sets with one instance, one run after the other.
+        The results of a run are released before the next run starts, its output data is kept.
+        Not thread-safe: every run sets the APP_ARTIFACTS_DIR environment variable of the process (and restores it).
+        :param runs: the data, the app configuration settings and the artifacts directory of each run
+        :return: the output data of each run
+        """
+        outputs = []
+        for data, config, artifacts_dir in runs:
+            os.makedirs(artifacts_dir, exist_ok=True)
+            previous_artifacts_dir = os.environ.get('APP_ARTIFACTS_DIR')
+            os.environ['APP_ARTIFACTS_DIR'] = artifacts_dir
+            try:
+                outputs.append(self.execute(data=data, config=config))
+            finally:
+                self.release()
+                if previous_artifacts_dir is None:
+                    del os.environ['APP_ARTIFACTS_DIR']
+                else:
+                    os.environ['APP_ARTIFACTS_DIR'] = previous_artifacts_dir
+        return outputs
+
+    @hook_impl
+    def merge_shards(self, data: TrajectoryCollection, artifact_dirs: List[str], config: dict) -> TrajectoryCollection:
+        """ Merges the results of shard runs into the outputs of a single run.
+        Nothing is recomputed: the stop tables are the csv artifacts of the shards and the segments after the stops
+        are the output data of the shards, both in the order of the input data. The input data only provides the
+        trajectory ids and the CRS, unless it is the output data: then the segments of the map are cut from it.
+        :param data: the combined input data of all shards
+        :param artifact_dirs: the artifact directories of the shard runs, containing their output data
+        :param config: the app configuration settings
+        :return: a collection of stop points as trajectories or the input data
+        """
+        logging.info(f'Merging Stop Detection results of {len(artifact_dirs)} shards with {config}')
+        import pandas as pd
+        import shapely
+        from app.crs import transform_geometries
+        from sdk.moveapps_sharding import SHARD_OUTPUT_FILE
+
+        self.app_config = self.map_config(config)  # override with user input
+        self.reset()
+        # the run starts here, its peak memory is measured from here
+        peak_of_run = reset_peak()
+        self.set_crs(data)
+        # the csv artifacts are written in the CRS of the input data, their geometries are kept as they are
+        self.stops_crs = self.crs
+
+        self.final_stop_points = self.read_shard_stops(artifact_dirs, 'final_stops.csv', data)
+        self.all_stop_points = self.final_stop_points if self.app_config.final_stops_only \
+            else self.read_shard_stops(artifact_dirs, 'all_stops.csv', data)
+
+        output_segments = None
+        if self.app_config.return_data == "trajectories":
+            # every shard keeps the order of its trajectories, the shards are interleaved in the order of the input
+            positions = {str(tr.id): i for i, tr in enumerate(data.trajectories)}
+            output_segments = [segment for artifact_dir in artifact_dirs for segment in
+                               pd.read_pickle(os.path.join(artifact_dir, SHARD_OUTPUT_FILE)).trajectories]
+            output_segments.sort(key=lambda segment: positions[str(segment.parent.id)])
+
+        input_bytes = sum(tr.df.memory_usage(deep=False).sum() for tr in data.trajectories)
+        segment_bytes = sum(segment.df.memory_usage(deep=False).sum() for segment in output_segments or [])
+        self.execution_plan = ExecutionPlanner(get_memory_budget(self.app_config.memory_budget_mb)) \
+            .plan_merge(input_bytes, segment_bytes)
+        self.execution_plan.peak_of_run = peak_of_run
+
+        if self.app_config.display_trajectories_after_stops:
+            if output_segments is None:
+                self.map_segments = self.cut_segments(data)
+            else:
+                for segment in output_segments:
+                    geometries = segment.df[segment.get_geom_col()].values
+                    if self.crs != self.working_crs:
+                        geometries = transform_geometries(geometries, self.crs, self.working_crs)
+                    self.map_segments.append(SegmentRange(str(segment.id), shapely.get_coordinates(geometries)))
+
+        return self.create_outputs(data, output_segments)
+
+    def read_shard_stops(self, artifact_dirs: List[str], file_name: str, data: TrajectoryCollection) -> GeoDataFrame:
+        """ Combines a stop csv artifact of the shard runs into the stop table of a single run.
+        :param artifact_dirs: the artifact directories of the shard runs
+        :param file_name: the name of the csv artifact
+        :param data: the combined input data of all shards, the stops are ordered like its trajectories
+        :return: the stop points with their stop data, in the CRS of the input data
+        """
+        import numpy as np
+        import pandas as pd
+        from geopandas import GeoDataFrame
+
+        shard_stops = [self.read_stops_csv(os.path.join(artifact_dir, file_name)) for artifact_dir in artifact_dirs]
+        shard_stops = [stops for stops in shard_stops if not stops.empty]
+        if not shard_stops:
+            return GeoDataFrame()
+        stops = pd.concat(shard_stops)
+        traj_ids = {str(tr.id): tr.id for tr in data.trajectories}
+        positions = {traj_id: i for i, traj_id in enumerate(traj_ids)}
+        stops = stops.iloc[np.argsort(stops['traj_id'].map(positions).to_numpy(), kind='stable')]
+        stops['traj_id'] = stops['traj_id'].map(traj_ids)
+        return stops.set_crs(self.crs, allow_override=True)
+
+    def cut_segments(self, data: TrajectoryCollection) -> List[SegmentRange]:
+        """ Cuts the segments after the merged stops from the input data, for the map.
+        :param data: the combined input data of all shards
+        :return: the segments in the working CRS
+        """
+        import shapely
+        from sdk.moveapps_sharding import with_trajectories
+
+        stops = self.final_stop_points if self.app_config.final_stops_only else self.all_stop_points
+        if stops.empty:
+            return []
+        start_times = stops.groupby('traj_id', sort=False)['start_time'].apply(list)
+        with_stops = with_trajectories(data, [tr for tr in data.trajectories if tr.id in start_times.index])
+        segments = []
+        for tr in self.normalize_crs(with_stops, windowed=True):
+            coordinates = shapely.get_coordinates(tr.df[tr.get_geom_col()].values)
+            for start_time in start_times.loc[tr.id]:
+                start = int(tr.df.index.searchsorted(start_time))
+                # a segment has at least two observations
+                if len(tr.df) - start >= 2:
+                    segments.append(SegmentRange(f"{tr.id}_{start_time}", coordinates, start))
+        return segments
+
+    @staticmethod
+    def read_stops_csv(path: str) -> GeoDataFrame:
+        """ Reads the stop points of a stop csv artifact.
+        :param path: the path of the csv file
+        :return: the stop points with their stop data, see add_stop_data()
+        """
+        import pandas as pd
+        from geopandas import GeoDataFrame, GeoSeries
+
+        # round trip: the stop data is the same as in the run that wrote the file
+        stops = pd.read_csv(path, dtype={'traj_id': str}, float_precision='round_trip') if os.path.exists(path) \
+            else pd.DataFrame()
+        if stops.empty:
+            # shard without any stops
+            return GeoDataFrame(columns=STOP_POINT_COLUMNS, geometry='geometry')
+        stops = stops.set_index('stop_id')
+        for column in ['start_time', 'end_time', 'final_observation_time']:
+            if column in stops:
+                stops[column] = pd.to_datetime(stops[column])
+        if 'time_tracked_since_stop_began' in stops:
+            stops['time_tracked_since_stop_began'] = pd.to_timedelta(stops['time_tracked_since_stop_began'])
+        stops['geometry'] = GeoSeries.from_wkt(stops['geometry'])
+        return GeoDataFrame(stops, geometry='geometry')
+
+    def create_outputs(self, data: TrajectoryCollection,
+                       output_segments: Optional[List[Trajectory]] = None) -> TrajectoryCollection:
+        """ Writes the map and csv artifacts and creates the output data from the collected stops.
+        :param data: the collection of trajectories that was analyzed
+        :param output_segments: the segments of the output data in the CRS of the input data, by default the
+            segments after the stops transformed back into it
+        :return: a collection of stop points as trajectories or the input data
+        """
+        from movingpandas import TrajectoryCollection
+        from app.crs import transform_trajectories
+
+        self.collect_stops()
+        self.stop_summary = self.summarize_stops(self.all_stop_points, [tr.id for tr in data.trajectories])
+        self.write_stop_summary()
+
+        self.plan_map()
+        self.generate_plot()
+
+        # write csv output files (in the CRS of the input data)
+        self.to_output_crs(self.final_stop_points).to_csv(self.moveapps_io.create_artifacts_file('final_stops.csv'))
 
         if not self.app_config.final_stops_only:
-            self.all_stop_points.to_csv(self.moveapps_io.create_artifacts_file('all_stops.csv'))
+            self.to_output_crs(self.all_stop_points).to_csv(self.moveapps_io.create_artifacts_file('all_stops.csv'))
 
         time_col_name = data.to_point_gdf().index.name
         track_id_col_name = data.get_traj_id_col()
         if self.app_config.return_data == "trajectories":
-            if self.app_config.final_stops_only:
-                return TrajectoryCollection(
-                    data=self.trajectories_after_final_stop,
-                    traj_id_col=track_id_col_name,
-                    t=time_col_name,
-                    crs='epsg:4326',
-                    x='coords_x', y='coords_y'
-                )
-            else:
-                return TrajectoryCollection(
-                    data=self.trajectories_after_all_stops,
-                    traj_id_col=track_id_col_name,
-                    t=time_col_name,
-                    crs='epsg:4326',
-                    x='coords_x', y='coords_y'
-                )
+            segments = output_segments
+            if segments is None:
+                segments = self.trajectories_after_final_stop if self.app_config.final_stops_only \
+                    else self.trajectories_after_all_stops
+                if self.crs != self.working_crs:
+                    segments = transform_trajectories(segments, self.working_crs, self.crs)
+            output = TrajectoryCollection(
+                data=[],
+                traj_id_col=track_id_col_name,
+                t=time_col_name,
+                crs=self.crs
+            )
+            # not passed to the constructor: its length filter would compute the length of every segment
+            output.trajectories = segments
+            data = output
+
+        if self.execution_plan is not None:
+            record_peak(self.execution_plan)
         return data
 
-    def generate_plot(self, track_id_col: str) -> None:
+    def generate_plot(self) -> None:
         """ Creates a map to display stops and final trajectories. """
+        map_strategy = self.execution_plan.map_strategy if self.execution_plan is not None else None
+        map_step = self.execution_plan.map_step if map_strategy == MAP_SIMPLIFIED else 1
+
         stops = self.final_stop_points.copy() if self.app_config.final_stops_only else self.all_stop_points.copy()
-        if len(stops) > 0:
+        if map_strategy == MAP_SKIPPED and len(stops) > 0:
+            logging.warning(f"The map of {len(stops)} stops exceeds the memory budget. Could not create map.")
+            with open(self.moveapps_io.create_artifacts_file('empty_map.html'), 'w') as f:
+                f.write('''<html>
+                            <body>
+                            <p>The map of {} stops was skipped, it exceeds the memory budget of the run.</p>
+                            <p>The stops are listed in the csv artifacts.</p>
+                            </body>
+                            </html>'''.format(len(stops)))
+        elif len(stops) > 0:
+            # only loaded if there is a map to draw
+            import folium
+            from app.crs import transform_stop_points
+
+            if self.stops_crs != self.working_crs:
+                # merged stop tables: only the map is drawn in the working CRS
+                stops = transform_stop_points(stops, self.stops_crs, self.working_crs)
+            stops = stops.set_crs(self.working_crs, allow_override=True)
             # rename fields to be more human friendly
             stops['Stop Start Time'] = stops['start_time'].astype(str)
             stops['Stop End Time'] = stops['end_time'].astype(str)
@@ -222,17 +745,10 @@ class App(object):
                                               stops.dissolve().centroid.x.iloc[0]],
                                     zoom_start=6)
 
-            segments = self.trajectories_after_final_stop if self.app_config.final_stops_only \
-                else self.trajectories_after_all_stops
-
-            if self.app_config.display_trajectories_after_stops and len(segments) > 0:
-                segments_as_dataframe = TrajectoryCollection(
-                    data=segments,
-                    crs='epsg:4326',
-                    x='coords_x',
-                    y='coords_y'
-                ).to_traj_gdf()
+            segments = self.map_segments
 
+            if self.app_config.display_trajectories_after_stops and len(segments) > 0 \
+                    and map_strategy != MAP_STOPS_ONLY:
                 # style function
                 style_function = lambda x: {
                     # specifying properties from GeoJSON
@@ -249,10 +765,9 @@ class App(object):
                     'weight': x['properties']['stroke-width']
                 }
 
-                for i in range(len(segments_as_dataframe)):
-                    locations = []
-                    for j in segments_as_dataframe.geometry[i].coords:
-                        locations.append([j[0], j[1]])
+                for segment in segments:
+                    # simplified map: every n-th observation and the last one
+                    locations = segment.get_coordinates(map_step).tolist()
 
                     trajectory_geojson = {
                         "type": "FeatureCollection",
@@ -278,7 +793,7 @@ class App(object):
                         control=True,
                         style_function=style_function,
                         highlight_function=highlight_function,
-                        tooltip=segments_as_dataframe[track_id_col][i]
+                        tooltip=segment.segment_id
                     )
                     folium_map.add_child(traj_info)
 
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame
+from movingpandas import Trajectory
+from pyproj import CRS, Transformer
+
+# Stop detection measures geodesic distances (on the WGS84 ellipsoid) on longitude / latitude coordinates.
+# Projected data is transformed into this CRS, so a stop diameter in meters means the same everywhere.
+WORKING_CRS = 'EPSG:4326'
+
+
+def is_working_crs(crs) -> bool:
+    """ Checks if data in a CRS can be analyzed as it is.
+    :param crs: the CRS of the data
+    :return: True for geographic (longitude / latitude) CRSs
+    """
+    return crs is None or CRS.from_user_input(crs).is_geographic
+
+
+@lru_cache(maxsize=32)
+def get_transformer(from_crs: str, to_crs: str) -> Transformer:
+    """ Creates a transformer between two CRSs. Transformers are cached and shared between runs.
+    :param from_crs: the source CRS (as accepted by pyproj)
+    :param to_crs: the target CRS (as accepted by pyproj)
+    :return: a transformer with longitude / latitude axis order
+    """
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def transform_geometries(geometries: np.ndarray, from_crs, to_crs) -> np.ndarray:
+    """ Transforms all coordinates of the geometries with a single vectorized call.
+    :param geometries: array of shapely geometries
+    :param from_crs: the CRS of the geometries
+    :param to_crs: the target CRS
+    :return: the transformed geometries
+    """
+    transformer = get_transformer(CRS.from_user_input(from_crs).to_wkt(), CRS.from_user_input(to_crs).to_wkt())
+    return shapely.transform(geometries, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+
+def transform_trajectories(trajectories: List[Trajectory], from_crs, to_crs) -> List[Trajectory]:
+    """ Transforms trajectories into another CRS with a single transformation of all their points.
+    :param trajectories: the trajectories to transform (all in `from_crs`)
+    :param from_crs: the CRS of the trajectories
+    :param to_crs: the target CRS
+    :return: copies of the trajectories in the target CRS
+    """
+    if not trajectories:
+        return []
+    points = transform_geometries(
+        np.concatenate([np.asarray(traj.df.geometry.values) for traj in trajectories]), from_crs, to_crs)
+    transformed = []
+    start = 0
+    for traj in trajectories:
+        end = start + len(traj.df)
+        df = GeoDataFrame(traj.df.drop(columns=traj.df.geometry.name), geometry=points[start:end], crs=to_crs)
+        transformed.append(Trajectory(df, traj.id, traj_id_col=traj.get_traj_id_col(), obj_id=traj.obj_id,
+                                      parent=traj.parent))
+        start = end
+    return transformed
+
+
+def transform_stop_points(stop_points: GeoDataFrame, from_crs, to_crs) -> GeoDataFrame:
+    """ Transforms the geometries of stop points into another CRS.
+    :param stop_points: the stop points (in `from_crs`)
+    :param from_crs: the CRS of the stop points
+    :param to_crs: the target CRS
+    :return: a copy of the stop points in the target CRS
+    """
+    transformed = stop_points.copy()
+    transformed[transformed.geometry.name] = transform_geometries(
+        np.asarray(stop_points.geometry.values), from_crs, to_crs)
+    return transformed.set_crs(to_crs, allow_override=True)
@@ -0,0 +1,214 @@
+from collections import deque
+from math import hypot
+from typing import List, Optional, Tuple
+
+Coordinate = Tuple[float, float]
+
+
+class SlidingExtremes:
+    """
+    Minimum and maximum of a sliding window of values with O(1) amortized push and pop: each deque only keeps the
+    values that can still become the minimum/maximum once the values before them are popped.
+    """
+
+    def __init__(self) -> None:
+        self.minima: deque = deque()
+        self.maxima: deque = deque()
+
+    def push(self, index: int, value: float) -> None:
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((index, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((index, value))
+
+    def pop(self, index: int) -> None:
+        """ Removes the value with the given index, the first one of the window. """
+        if self.minima[0][0] == index:
+            self.minima.popleft()
+        if self.maxima[0][0] == index:
+            self.maxima.popleft()
+
+    def collapse(self) -> None:
+        """ Keeps only the current minimum and maximum, the window will not be popped anymore. """
+        while len(self.minima) > 1:
+            self.minima.pop()
+        while len(self.maxima) > 1:
+            self.maxima.pop()
+
+    def clear(self) -> None:
+        self.minima.clear()
+        self.maxima.clear()
+
+    def min(self) -> float:
+        return self.minima[0][1]
+
+    def max(self) -> float:
+        return self.maxima[0][1]
+
+
+def cross(o: Coordinate, a: Coordinate, b: Coordinate) -> float:
+    """ :return: the cross product of o->a and o->b, positive if o, a, b turn counterclockwise """
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(points: List[Coordinate]) -> List[Coordinate]:
+    """ The convex hull of points (Andrew's monotone chain).
+    :param points: the points
+    :return: the vertices of the hull in counterclockwise order, without collinear points
+    """
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+    lower: List[Coordinate] = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper: List[Coordinate] = []
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+def is_inside(hull: List[Coordinate], point: Coordinate) -> bool:
+    """ Checks if a point is strictly inside a convex hull.
+    :param hull: the vertices of the hull in counterclockwise order, see convex_hull()
+    :param point: the point
+    :return: False for points outside or on the boundary
+    """
+    if len(hull) < 3:
+        return False
+    previous = hull[-1]
+    for vertex in hull:
+        if cross(previous, vertex, point) <= 0:
+            return False
+        previous = vertex
+    return True
+
+
+def hull_diameter(hull: List[Coordinate]) -> float:
+    """ The largest distance between two vertices of a convex hull (rotating calipers).
+    :param hull: the vertices of the hull in counterclockwise order, see convex_hull()
+    :return: the diameter, in the units of the coordinates
+    """
+    n = len(hull)
+    if n < 2:
+        return 0.0
+    if n == 2:
+        return hypot(hull[1][0] - hull[0][0], hull[1][1] - hull[0][1])
+    diameter = 0.0
+    j = 1
+    for i in range(n):
+        a, b = hull[i], hull[(i + 1) % n]
+        # advance the antipodal vertex of the edge a-b while it gets further away from the edge
+        while abs(cross(a, b, hull[(j + 1) % n])) > abs(cross(a, b, hull[j])):
+            j = (j + 1) % n
+        diameter = max(diameter, hypot(hull[j][0] - a[0], hull[j][1] - a[1]),
+                       hypot(hull[j][0] - b[0], hull[j][1] - b[1]))
+    return diameter
+
+
+def is_degenerate(hull: List[Coordinate], tolerance: float) -> bool:
+    """ Checks if a convex hull is a segment or a thin polygon, i.e. its points are (nearly) collinear.
+    :param hull: the vertices of the hull in counterclockwise order, see convex_hull()
+    :param tolerance: the largest area of a thin polygon relative to the square of its diameter
+    :return: False for a single point
+    """
+    if len(hull) < 3:
+        return len(hull) == 2
+    area = sum(cross(hull[0], hull[i], hull[i + 1]) for i in range(1, len(hull) - 1)) / 2
+    return area <= tolerance * hull_diameter(hull) ** 2
+
+
+class WindowHull:
+    """
+    Convex hull of a sliding window of points: points are pushed at the end and popped at the start.
+
+    The window is a queue of two stacks. The back stack keeps the hull of its points, the front stack keeps the hull
+    of every suffix, so the hull of the window is the hull of two hulls. Every point is moved from the back to the
+    front once: push and pop take amortized O(h log h) for hulls of h vertices, independent of the window length.
+    Pushes and pops are only recorded, the hull is updated when it is requested. Points inside the hull leave it
+    unchanged, which is the common case for the fixes of a stop.
+
+    The hull is computed in the plane of the coordinates, for longitude / latitude as for the minimum rotated
+    rectangle of the stop detector.
+    """
+
+    def __init__(self) -> None:
+        self.front: List[List[Coordinate]] = []  # hull of each suffix of the front points, the oldest point is last
+        self.back: List[Coordinate] = []  # points after the front points, in window order
+        self.back_hull: List[Coordinate] = []  # hull of the first `back_hull_size` back points
+        self.back_hull_size = 0
+        self.popped = 0  # points popped from the start of the window that are not removed yet
+        self.window_hull: Optional[List[Coordinate]] = None  # hull of the window, None if it has to be updated
+        self.window_diameter: Optional[Tuple[List[Coordinate], float]] = None  # diameter of the last hull
+
+    def __len__(self) -> int:
+        return len(self.front) + len(self.back) - self.popped
+
+    def push(self, x: float, y: float) -> None:
+        self.back.append((x, y))
+
+    def pop(self) -> None:
+        """ Removes the first point of the window. """
+        if len(self) == 0:
+            raise IndexError('pop from an empty window')
+        self.popped += 1
+
+    def clear(self) -> None:
+        self.front = []
+        self.back = []
+        self.back_hull = []
+        self.back_hull_size = 0
+        self.popped = 0
+        self.window_hull = None
+
+    def hull(self) -> List[Coordinate]:
+        """ :return: the vertices of the hull of the window in counterclockwise order, the same list as long as
+            the hull does not change
+        """
+        while self.popped:
+            if not self.front:
+                self.__move_to_front()
+            removed = min(self.popped, len(self.front))
+            del self.front[len(self.front) - removed:]
+            self.popped -= removed
+            self.window_hull = None
+        if self.back_hull_size < len(self.back):
+            outside = [point for point in self.back[self.back_hull_size:] if not is_inside(self.back_hull, point)]
+            if outside:
+                self.back_hull = convex_hull(self.back_hull + outside)
+                if self.window_hull is not None and not all(is_inside(self.window_hull, point) for point in outside):
+                    self.window_hull = None
+            self.back_hull_size = len(self.back)
+        if self.window_hull is None:
+            if not self.front:
+                self.window_hull = self.back_hull
+            elif not self.back_hull:
+                self.window_hull = self.front[-1]
+            else:
+                self.window_hull = convex_hull(self.front[-1] + self.back_hull)
+        return self.window_hull
+
+    def diameter(self) -> float:
+        """ :return: the largest distance between two points of the window, in the units of the coordinates """
+        hull = self.hull()
+        if self.window_diameter is None or self.window_diameter[0] is not hull:
+            self.window_diameter = (hull, hull_diameter(hull))
+        return self.window_diameter[1]
+
+    def __move_to_front(self) -> None:
+        """ Moves the back points to the front, points that are already popped are dropped. """
+        dropped = min(self.popped, len(self.back))
+        self.popped -= dropped
+        hull: List[Coordinate] = []
+        for point in reversed(self.back[dropped:]):
+            hull = convex_hull(hull + [point])
+            self.front.append(hull)
+        self.back = []
+        self.back_hull = []
+        self.back_hull_size = 0
@@ -0,0 +1,198 @@
+import logging
+import math
+import os
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+# environment variable with the memory budget of a run in megabytes, e.g. the memory limit of the container
+MEMORY_BUDGET_ENV = 'APP_MEMORY_BUDGET_MB'
+
+# strategies of the stop detection
+IN_MEMORY = 'in_memory'  # the whole collection is transformed at once
+WINDOWED = 'windowed'  # one trajectory at a time, only one transformed trajectory is kept in memory
+MERGED = 'merged'  # the results of shard runs are combined, no stops are detected
+
+# strategies of the map
+MAP_FULL = 'full'  # stops and segments after the stops
+MAP_SIMPLIFIED = 'simplified'  # stops and every n-th observation of the segments after the stops
+MAP_STOPS_ONLY = 'stops_only'  # stops without segments
+MAP_SKIPPED = 'skipped'  # no map
+
+# Estimated memory in bytes (measured with tracemalloc on the sample and synthetic data):
+# stop detection and movement of a trajectory, per observation
+DETECTION_BYTES_PER_POINT = 1000
+# speed, distance and index of an observation of a returned segment after a stop (besides the input columns)
+SEGMENT_BYTES_PER_POINT = 100
+# coordinates of an observation of a trajectory with stops, kept for the segments on the map
+COORDINATE_BYTES_PER_POINT = 16
+# map: coordinates and GeoJSON of an observation of a segment and the marker and popup of a stop
+MAP_BYTES_PER_POINT = 300
+MAP_BYTES_PER_STOP = 12000
+
+
+@dataclass
+class ExecutionPlan:
+    # strategy of the stop detection, IN_MEMORY, WINDOWED or MERGED
+    strategy: str
+
+    # strategy of the map, see plan_map()
+    map_strategy: str = MAP_FULL
+
+    # only every n-th observation of the segments is displayed on a simplified map
+    map_step: int = 1
+
+    # memory budget and estimated memory of the run in bytes
+    budget_bytes: Optional[int] = None
+    estimated_bytes: int = 0
+
+    # memory of an observation of the input data in bytes
+    bytes_per_point: float = 0.0
+
+    # peak memory (resident set size) in bytes, see record_peak()
+    peak_bytes: Optional[int] = None
+
+    # whether peak_bytes is the peak of this run (see reset_peak()) or of the process since it started
+    peak_of_run: bool = False
+
+    def __str__(self) -> str:
+        budget = 'no budget' if self.budget_bytes is None else f'budget {self.budget_bytes / 1e6:.0f} MB'
+        map_strategy = f'{self.map_strategy} (every {self.map_step}. observation)' if self.map_step > 1 \
+            else self.map_strategy
+        return f'{self.strategy}, map {map_strategy}, estimated {self.estimated_bytes / 1e6:.0f} MB of {budget}'
+
+
+def get_memory_budget(budget_mb: Optional[float] = None) -> Optional[int]:
+    """ Gets the memory budget of a run.
+    :param budget_mb: the budget of the app configuration in megabytes, overrides the environment variable
+    :return: the budget in bytes, None without a budget
+    """
+    if budget_mb is None:
+        budget_mb = os.environ.get(MEMORY_BUDGET_ENV)
+    if budget_mb is None or budget_mb == '':
+        return None
+    return int(float(budget_mb) * 1e6)
+
+
+class ExecutionPlanner:
+    """
+    Chooses how a run is executed within a memory budget. The footprint is estimated from the number of
+    observations: the input data, the working copy of the trajectories, the stop detection of the largest
+    trajectory and the segments after the stops. The map is planned once the stops are known.
+    """
+
+    def __init__(self, budget_bytes: Optional[int]) -> None:
+        """
+        :param budget_bytes: the memory budget in bytes, None to run everything in memory
+        """
+        self.budget_bytes = budget_bytes
+
+    def plan(self, point_counts: List[int], bytes_per_point: float, transform: bool) -> ExecutionPlan:
+        """ Plans the stop detection of a collection. The segments after the stops depend on the detected stops,
+        they are added with plan_segments().
+        :param point_counts: the number of observations of each trajectory
+        :param bytes_per_point: the memory of an observation of the input data
+        :param transform: whether the trajectories are transformed into the working CRS
+        :return: the plan, the map is planned with plan_map()
+        """
+        total = sum(point_counts)
+        largest = max(point_counts, default=0)
+        input_bytes = total * bytes_per_point
+        detection_bytes = largest * DETECTION_BYTES_PER_POINT
+        in_memory = input_bytes * (2 if transform else 1) + detection_bytes
+        if self.budget_bytes is None or in_memory <= self.budget_bytes:
+            return ExecutionPlan(IN_MEMORY, budget_bytes=self.budget_bytes, estimated_bytes=int(in_memory),
+                                 bytes_per_point=bytes_per_point)
+
+        windowed = input_bytes + (largest * bytes_per_point if transform else 0) + detection_bytes
+        self.__warn_if_exceeded(windowed)
+        return ExecutionPlan(WINDOWED, budget_bytes=self.budget_bytes, estimated_bytes=int(windowed),
+                             bytes_per_point=bytes_per_point)
+
+    def plan_segments(self, plan: ExecutionPlan, segment_point_count: int, coordinate_point_count: int) -> None:
+        """ Adds the segments after the detected stops to the plan. A segment runs from its stop to the end of the
+        trajectory, so the segments of a trajectory with several stops overlap: their size is the sum of
+        (observations - position of the stop) over the stops, not the size of the trajectory.
+        :param plan: the plan of the run, updated with the memory of the segments
+        :param segment_point_count: the number of observations of the returned segments (0 if the input is returned)
+        :param coordinate_point_count: the number of observations of the trajectories whose segments are on the map,
+            the map cuts its segments from their coordinates
+        """
+        plan.estimated_bytes += int(segment_point_count * (plan.bytes_per_point + SEGMENT_BYTES_PER_POINT) +
+                                    coordinate_point_count * COORDINATE_BYTES_PER_POINT)
+        self.__warn_if_exceeded(plan.estimated_bytes)
+
+    def plan_merge(self, input_bytes: float, segment_bytes: float) -> ExecutionPlan:
+        """ Plans the merge of shard runs, it keeps the input data and the segments of all shards.
+        :param input_bytes: the memory of the combined input data
+        :param segment_bytes: the memory of the segments after the stops of all shards
+        :return: the plan, the map is planned with plan_map()
+        """
+        return ExecutionPlan(MERGED, budget_bytes=self.budget_bytes, estimated_bytes=int(input_bytes + segment_bytes))
+
+    def __warn_if_exceeded(self, estimated_bytes: float) -> None:
+        if self.budget_bytes is not None and estimated_bytes > self.budget_bytes:
+            logging.warning(f'The estimated memory of {estimated_bytes / 1e6:.0f} MB exceeds the memory budget of '
+                            f'{self.budget_bytes / 1e6:.0f} MB')
+
+    def plan_map(self, plan: ExecutionPlan, stop_count: int, segment_point_count: int) -> None:
+        """ Plans the map within the memory left by the stop detection.
+        :param plan: the plan of the run, updated with the map strategy
+        :param stop_count: the number of stops on the map
+        :param segment_point_count: the number of observations of the segments on the map
+        """
+        stops_bytes = stop_count * MAP_BYTES_PER_STOP
+        segments_bytes = segment_point_count * MAP_BYTES_PER_POINT
+        available = None if self.budget_bytes is None else self.budget_bytes - plan.estimated_bytes
+
+        plan.map_step = 1
+        # without stops the map only reports that no stops were detected
+        if available is None or stop_count == 0 or stops_bytes + segments_bytes <= available:
+            plan.map_strategy = MAP_FULL
+            map_bytes = stops_bytes + segments_bytes
+        elif stops_bytes + 2 * MAP_BYTES_PER_POINT * stop_count <= available:
+            # at least the first and the last observation of each segment are displayed
+            plan.map_strategy = MAP_SIMPLIFIED
+            plan.map_step = math.ceil(segments_bytes / (available - stops_bytes))
+            map_bytes = stops_bytes + segments_bytes // plan.map_step
+        elif stops_bytes <= available:
+            plan.map_strategy = MAP_STOPS_ONLY
+            map_bytes = stops_bytes
+        else:
+            plan.map_strategy = MAP_SKIPPED
+            map_bytes = 0
+        plan.estimated_bytes += map_bytes
+
+
+def reset_peak() -> bool:
+    """ Resets the peak memory (resident set size) of the process to its current memory, so that record_peak() gets
+    the peak of a run and not the peak of all earlier runs of the process (`App.execute_batch()`, the worker).
+    :return: whether the peak was reset, only supported on Linux
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def record_peak(plan: ExecutionPlan) -> None:
+    """ Records the peak memory (resident set size) in the plan and logs it: the peak of the run if it was reset at
+    the start of the run, otherwise the peak of the process since it started.
+    """
+    if plan.peak_of_run:
+        with open('/proc/self/status') as f:
+            peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+        plan.peak_bytes = peak_kb * 1024
+        logging.info(f'Peak memory of the run: {plan.peak_bytes / 1e6:.0f} MB ({plan})')
+        return
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    plan.peak_bytes = peak if sys.platform == 'darwin' else peak * 1024
+    logging.info(f'Peak memory of the process since it started: {plan.peak_bytes / 1e6:.0f} MB ({plan})')
@@ -0,0 +1,335 @@
+from math import hypot, sqrt
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import shapely
+from geopy import distance
+from movingpandas import Trajectory, TrajectoryStopDetector
+from movingpandas.geometry_utils import mrr_diagonal
+from movingpandas.spatiotemporal_utils import TRangeWithTrajId
+from pyproj import Geod
+
+from app.diameter import SlidingExtremes, WindowHull, is_degenerate
+
+# number of fixes a backward search step analyzes at least, growing with every step
+INITIAL_CHUNK_SIZE = 64
+CHUNK_GROWTH = 4
+
+# relative tolerance of the vectorized distances, breaks closer to the threshold are confirmed with the distance of
+# the stop detector
+BREAK_TOLERANCE = 1e-6
+
+# relative tolerance of the diameter bounds of the minimum rotated rectangle diagonal, closer windows are decided by
+# the diagonal itself
+DIAMETER_TOLERANCE = 1e-9
+
+# largest area of a thin window relative to the square of its diameter: the rectangle shapely computes for (nearly)
+# collinear fixes depends on all of them, so it is not the rectangle of their hull
+THIN_WINDOW_RATIO = 0.1
+
+
+class StopScan:
+    """
+    The forward scan of `TrajectoryStopDetector` over positions of a trajectory, one fix at a time.
+    Its state is the window of fixes [start, position] and whether they form a stop, so two scans in the same
+    state detect the same stops from then on.
+    """
+
+    def __init__(self, detector: 'StopDetector', start: int) -> None:
+        """
+        :param detector: the detector providing the fixes and parameters
+        :param start: the position of the first fix to scan
+        """
+        detector.load(start)
+        self.detector = detector
+        self.start = start
+        self.position = start - 1
+        self.is_stopped = False
+        self.stops: List[Tuple[int, int]] = []
+        # bounding box and hull of the window, updated with every added and removed fix
+        self.minmax_x = SlidingExtremes()
+        self.minmax_y = SlidingExtremes()
+        self.window = WindowHull()
+        # the last bounding box of the window and its diagonal
+        self.bbox: Optional[Tuple[float, float, float, float]] = None
+        self.bbox_diagonal = 0.0
+        # the last hull of the window, whether it is degenerate and whether it is within the maximum diameter
+        self.hull: Optional[List[Tuple[float, float]]] = None
+        self.hull_is_degenerate = False
+        self.hull_is_within = False
+
+    def state(self) -> Tuple[int, bool]:
+        return self.start, self.is_stopped
+
+    def step(self) -> None:
+        """ Adds the next fix to the window, as `TrajectoryStopDetector._process_traj()` does. """
+        d = self.detector
+        ts, offset = d.ts, d.offset
+        self.position += 1
+        end = self.position
+        self.__push(end)
+        previously_stopped = self.is_stopped
+
+        if not previously_stopped:  # remove points to the specified min_duration
+            while end - self.start + 1 > 2 and ts[end - offset] - ts[self.start - offset] >= d.min_duration:
+                self.__pop()
+
+        self.is_stopped = False
+        if end - self.start + 1 > 1:
+            bbox = (self.minmax_x.min(), self.minmax_y.min(), self.minmax_x.max(), self.minmax_y.max())
+            if bbox != self.bbox:
+                self.bbox, self.bbox_diagonal = bbox, d.distance(*bbox)
+            if self.bbox_diagonal < d.max_diameter * 1.5:
+                hull = self.window.hull()
+                if hull is not self.hull:
+                    self.hull, self.hull_is_degenerate = hull, is_degenerate(hull, THIN_WINDOW_RATIO)
+                    self.hull_is_within = d.is_within(self.window, self.start, end, self.hull_is_degenerate)
+                elif self.hull_is_degenerate:
+                    # the rectangle of a degenerate window depends on all its fixes, not only on its hull
+                    self.hull_is_within = d.is_within(self.window, self.start, end, True)
+                self.is_stopped = self.hull_is_within
+
+        if not self.is_stopped and previously_stopped and end - self.start + 1 > 1:
+            if ts[end - 1 - offset] - ts[self.start - offset] >= d.min_duration:  # detected end of a stop
+                self.stops.append((self.start, end - 1))
+                self.__restart(end)
+
+    def finish(self) -> List[Tuple[int, int]]:
+        """ :return: the positions of the first and last fix of the stops, including a stop at the end """
+        d = self.detector
+        if self.is_stopped and d.ts[self.position - d.offset] - d.ts[self.start - d.offset] >= d.min_duration:
+            return self.stops + [(self.start, self.position)]
+        return self.stops
+
+    def __push(self, position: int) -> None:
+        """ Adds the fix at a position to the end of the window. """
+        d = self.detector
+        x, y = d.xs[position - d.offset], d.ys[position - d.offset]
+        self.minmax_x.push(position, x)
+        self.minmax_y.push(position, y)
+        self.window.push(x, y)
+
+    def __pop(self) -> None:
+        """ Removes the first fix of the window. """
+        self.minmax_x.pop(self.start)
+        self.minmax_y.pop(self.start)
+        self.window.pop()
+        self.start += 1
+
+    def __restart(self, position: int) -> None:
+        """ Restarts the window with the fix at a position. """
+        self.minmax_x.clear()
+        self.minmax_y.clear()
+        self.window.clear()
+        self.start = position
+        self.__push(position)
+
+
+class StopDetector(TrajectoryStopDetector):
+    """
+    Detects the stops of a trajectory as `TrajectoryStopDetector` does, with the window of the forward scan kept
+    incrementally: its bounding box with sliding minima/maxima and its convex hull with a `WindowHull`. The minimum
+    rotated rectangle of a window is the rectangle of its hull, so every fix costs a step on the hull instead of a
+    rectangle of the whole window, which makes long stops of dense tracks affordable. Windows of (nearly) collinear
+    fixes are the exception: shapely returns a degenerate rectangle that depends on all fixes, so their rectangle
+    is computed from the fixes as `TrajectoryStopDetector` does.
+    """
+
+    def get_stop_time_ranges(self, max_diameter, min_duration):
+        """ Returns the time ranges of the stops.
+        :param max_diameter: maximum diameter for stop detection
+        :param min_duration: minimum stop duration
+        :return: a list with the time ranges of the stops
+        """
+        if not isinstance(self.traj, Trajectory):
+            raise TypeError('the stops can only be detected in a single trajectory')
+        self.prepare(max_diameter, min_duration)
+        scan = StopScan(self, 0)
+        while scan.position < len(self.t) - 1:
+            scan.step()
+        times = self.traj.df.index
+        return [TRangeWithTrajId(times[start], times[end], self.traj.id) for start, end in scan.finish()]
+
+    def prepare(self, max_diameter, min_duration) -> None:
+        """ Prepares the fixes and parameters of the scans.
+        :param max_diameter: maximum diameter for stop detection
+        :param min_duration: minimum stop duration
+        """
+        # coordinates and nanosecond timestamps of all fixes, see load() for the fixes the scans access
+        geometry = self.traj.df[self.traj.get_geom_col()]
+        self.x = geometry.x.to_numpy()
+        self.y = geometry.y.to_numpy()
+        self.t = self.traj.df.index.to_numpy().astype('datetime64[ns]').astype(np.int64)
+        self.xs: List[float] = []
+        self.ys: List[float] = []
+        self.ts: List[int] = []
+        self.offset = len(self.t)
+        self.max_diameter = max_diameter
+        self.min_duration = pd.Timedelta(min_duration).value
+
+    def load(self, start: int) -> None:
+        """ Provides the fixes from a position on to the scans. The scans access single fixes, which is faster in
+        plain lists than in arrays, but only the fixes they step through are converted: the lists `xs`, `ys` and `ts`
+        hold the fixes from `offset` on.
+        :param start: the position of the first fix a scan accesses
+        """
+        if start < self.offset:
+            self.xs = self.x[start:self.offset].tolist() + self.xs
+            self.ys = self.y[start:self.offset].tolist() + self.ys
+            self.ts = self.t[start:self.offset].tolist() + self.ts
+            self.offset = start
+
+    def distance(self, minx, miny, maxx, maxy) -> float:
+        """ The diagonal of a bounding box, measured as the stop detector does. """
+        if self.traj.is_latlon:
+            return distance.distance((miny, minx), (maxy, maxx)).meters
+        return hypot(maxx - minx, maxy - miny)
+
+    def is_within(self, window: WindowHull, start: int, end: int, degenerate: bool = False) -> bool:
+        """ Checks if the diagonal of the minimum rotated rectangle of a window is within the maximum diameter.
+        :param window: the hull of the window
+        :param start: the position of the first fix of the window
+        :param end: the position of the last fix of the window
+        :param degenerate: whether the hull of the window is degenerate, see is_degenerate()
+        :return: True if the diagonal is shorter than the maximum diameter
+        """
+        if degenerate and end - start + 1 > 2:
+            # neither the hull nor its diameter determine the rectangle of collinear fixes
+            fixes = shapely.multipoints(np.column_stack([self.x[start:end + 1], self.y[start:end + 1]]))
+            return mrr_diagonal(fixes, self.traj.is_latlon) < self.max_diameter
+        if not self.traj.is_latlon:
+            # the diagonal is at least the diameter and at most sqrt(2) times the diameter (the sides of the
+            # rectangle are not longer than the diameter)
+            diameter = window.diameter()
+            if diameter >= self.max_diameter * (1 + DIAMETER_TOLERANCE):
+                return False
+            if diameter * sqrt(2) < self.max_diameter * (1 - DIAMETER_TOLERANCE):
+                return True
+        return mrr_diagonal(shapely.multipoints(window.hull()), self.traj.is_latlon) < self.max_diameter
+
+
+class FinalStopDetector(StopDetector):
+    """
+    Detects only the final stop of a trajectory, the one `TrajectoryStopDetector` detects last.
+    The search starts at the last observation and goes backwards until the final stop is confirmed, so its costs
+    depend on the recent history of the trajectory instead of its full length.
+
+    The search relies on breaks: two consecutive fixes further apart than 1.5 times the maximum diameter.
+    The stop detector never reports a stop for a window containing both fixes of a break, so after a break
+    only two states of the forward scan are possible: a stop ended right before the break or not. The part of the
+    trajectory after the break is scanned for both states. If they lead to the same stops, these are the stops
+    of the forward scan. Otherwise the part is extended to an earlier break.
+    """
+
+    def get_stop_time_ranges(self, max_diameter, min_duration):
+        """ Returns the time range of the final stop.
+        :param max_diameter: maximum diameter for stop detection
+        :param min_duration: minimum stop duration
+        :return: a list with the time range of the final stop, empty if the trajectory has no stop
+        """
+        if not isinstance(self.traj, Trajectory):
+            raise TypeError('the final stop can only be detected in a single trajectory')
+        final_stop = self.get_final_stop(max_diameter, min_duration)
+        if final_stop is None:
+            return []
+        times = self.traj.df.index
+        return [TRangeWithTrajId(times[final_stop[0]], times[final_stop[1]], self.traj.id)]
+
+    def get_final_stop(self, max_diameter, min_duration) -> Optional[Tuple[int, int]]:
+        """ Searches the final stop of the trajectory backwards from the last observation.
+        :param max_diameter: maximum diameter for stop detection
+        :param min_duration: minimum stop duration
+        :return: the positions of the first and last fix of the final stop or None if the trajectory has no stop
+        """
+        self.prepare(max_diameter, min_duration)
+        breaks = self.__breaks()
+        known_breaks: List[int] = []
+        # the forward scan of the fixes [0, end] has the same stops as the full trajectory, no stop after them
+        end = len(self.t) - 1
+        chunk_size = INITIAL_CHUNK_SIZE
+        latest = end
+        while True:
+            # latest break (b, b+1) with at least `chunk_size` fixes after it
+            b = self.__find_break(breaks, known_breaks, min(latest, end - chunk_size))
+            if b is None:
+                scan = StopScan(self, 0)
+                while scan.position < end:
+                    scan.step()
+                stops = scan.finish()
+                return stops[-1] if stops else None
+
+            stops = self.__scan_after_break(b, end)
+            if stops:
+                return stops[-1]
+            if stops is not None:
+                # no stop after the break: continue with the fixes before it
+                end = b + 1
+            # otherwise the stops depend on the state before the break
+            latest = b - 1
+            chunk_size *= CHUNK_GROWTH
+
+    def __scan_after_break(self, b: int, end: int) -> Optional[List[Tuple[int, int]]]:
+        """ Scans the fixes after the break (b, b+1) up to `end`.
+        :return: the stops after the break or None if they depend on the state before the break
+        """
+        # a stop ended right before the break: the scan restarts at b+1
+        after_stop = StopScan(self, b + 1)
+        # no stop ended: the window contains b until it gets trimmed
+        no_stop = StopScan(self, b)
+        no_stop.step()
+        while after_stop.position < end:
+            after_stop.step()
+            no_stop.step()
+            if after_stop.state() == no_stop.state():
+                if after_stop.stops != no_stop.stops:
+                    return None
+                # the scans are the same from now on
+                while after_stop.position < end:
+                    after_stop.step()
+                return after_stop.finish()
+        stops = after_stop.finish()
+        return stops if stops == no_stop.finish() else None
+
+    @staticmethod
+    def __find_break(breaks: Iterator[int], known_breaks: List[int], latest: int) -> Optional[int]:
+        """ The latest break at or before `latest`, breaks are found lazily in descending order. """
+        while not known_breaks or known_breaks[-1] > latest:
+            b = next(breaks, None)
+            if b is None:
+                break
+            known_breaks.append(b)
+        for b in known_breaks:
+            if b <= latest:
+                return b
+        return None
+
+    def __breaks(self) -> Iterator[int]:
+        """ Finds the breaks of the trajectory from its end backwards.
+        :return: the positions b of the breaks (b, b+1) in descending order
+        """
+        geod = Geod(ellps='WGS84')
+        threshold = self.max_diameter * 1.5
+
+        xs = self.x
+        ys = self.y
+        end = len(xs) - 1
+        chunk_size = INITIAL_CHUNK_SIZE
+        while end > 0:
+            start = max(0, end - chunk_size)
+            minx = np.minimum(xs[start:end], xs[start + 1:end + 1])
+            maxx = np.maximum(xs[start:end], xs[start + 1:end + 1])
+            miny = np.minimum(ys[start:end], ys[start + 1:end + 1])
+            maxy = np.maximum(ys[start:end], ys[start + 1:end + 1])
+            if self.traj.is_latlon:
+                _, _, diagonals = geod.inv(minx, miny, maxx, maxy)
+            else:
+                diagonals = np.hypot(maxx - minx, maxy - miny)
+
+            for offset in np.flatnonzero(diagonals >= threshold * (1 - BREAK_TOLERANCE))[::-1]:
+                # close to the threshold: confirmed with the distance of the stop detector
+                if diagonals[offset] >= threshold * (1 + BREAK_TOLERANCE) or \
+                        self.distance(minx[offset], miny[offset], maxx[offset], maxy[offset]) >= threshold:
+                    yield int(start + offset)
+            end = start
+            chunk_size *= 2
@@ -0,0 +1,282 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from math import hypot
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from movingpandas import Trajectory, TrajectoryCollection
+from pyproj import CRS, Geod
+
+from app.app import App
+from app.crs import WORKING_CRS, get_transformer, is_working_crs
+from app.diameter import SlidingExtremes
+
+# kinds of stop events
+STOP_CONFIRMED = 'confirmed'  # the stop lasted `min_duration_hours` within `max_diameter_meters`
+STOP_ENDED = 'ended'  # a confirmed stop ended: the individual left the stop area
+
+
+class Fix(NamedTuple):
+    """ A single observation of an individual. """
+    individual: str
+    time: pd.Timestamp
+    x: float
+    y: float
+    # time.perf_counter() when the fix was received, used to measure the latency of the events
+    received: Optional[float] = None
+
+
+@dataclass
+class StopEvent:
+    kind: str
+    individual: str
+    start_time: pd.Timestamp
+    # time of the last fix of the stop
+    end_time: pd.Timestamp
+    duration_s: float
+    # center of the stop area, in the CRS of the fixes
+    x: float
+    y: float
+    # seconds between receiving the fix that triggered the event and emitting the event
+    latency_s: Optional[float] = None
+
+
+class OpenWindow:
+    """
+    The open window of an individual: the latest fixes that are within the maximum diameter.
+    Before a stop is confirmed the window holds at most the fixes of the last `min_duration_hours`, afterwards only
+    the start time and the extent of the stop are kept.
+    """
+
+    def __init__(self) -> None:
+        self.times: deque = deque()  # (index, time) of the fixes in the window
+        self.xs = SlidingExtremes()
+        self.ys = SlidingExtremes()
+        self.next_index = 0
+        self.start_time: Optional[pd.Timestamp] = None
+        self.last_time: Optional[pd.Timestamp] = None
+        self.confirmed = False
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def push(self, t: pd.Timestamp, x: float, y: float) -> None:
+        index = self.next_index
+        self.next_index += 1
+        self.times.append((index, t))
+        self.xs.push(index, x)
+        self.ys.push(index, y)
+        if self.start_time is None:
+            self.start_time = t
+        self.last_time = t
+        if self.confirmed:
+            self.confirm()
+
+    def confirm(self) -> None:
+        """ Marks the window as stop, from now on only the extent of the stop is kept. """
+        self.confirmed = True
+        while len(self.times) > 1:
+            self.times.popleft()
+        self.xs.collapse()
+        self.ys.collapse()
+
+    def pop(self) -> None:
+        """ Removes the first fix of the window. """
+        index, _ = self.times.popleft()
+        self.xs.pop(index)
+        self.ys.pop(index)
+        self.start_time = self.times[0][1]
+
+    def extent(self) -> Tuple[float, float, float, float]:
+        return self.xs.min(), self.ys.min(), self.xs.max(), self.ys.max()
+
+    def center(self) -> Tuple[float, float]:
+        minx, miny, maxx, maxy = self.extent()
+        return (minx + maxx) / 2, (miny + maxy) / 2
+
+
+class StreamingStopDetector:
+    """
+    Detects stops in fixes arriving one at a time (or in micro-batches per individual), with the configuration of
+    the App. An event is emitted as soon as the fixes of an individual stayed within `max_diameter_meters` for
+    `min_duration_hours` (`confirmed`) and when the individual left a confirmed stop (`ended`).
+
+    The open window of an individual is the longest run of latest fixes whose bounding box diagonal is shorter than
+    `max_diameter_meters`. The bounding box is kept with sliding minima/maxima, so every fix is added and removed
+    once: O(1) amortized work per fix. The bounding box diagonal is an upper bound of the window diameter, a stream
+    confirms a stop only if all its fixes are within the maximum diameter.
+    """
+
+    def __init__(self, config: dict, crs=None) -> None:
+        """
+        :param config: the app configuration settings
+        :param crs: the CRS of the fixes. Projected coordinates are transformed into the working CRS.
+        """
+        self.app_config = App.map_config(config)
+        self.min_duration = pd.Timedelta(hours=self.app_config.min_duration_hours)
+        self.max_diameter = self.app_config.max_diameter_meters
+        self.crs = crs
+        self.transformer = None
+        if not is_working_crs(crs):
+            self.transformer = get_transformer(CRS.from_user_input(crs).to_wkt(),
+                                               CRS.from_user_input(WORKING_CRS).to_wkt())
+        # without a CRS the distances are euclidean, as for the stop detector
+        self.is_latlon = crs is not None
+        self.geod = Geod(ellps='WGS84')
+        self.windows: Dict[str, OpenWindow] = {}
+
+    def push(self, fix: Fix) -> List[StopEvent]:
+        """ Adds a single fix.
+        :param fix: the fix, fixes of an individual must arrive in time order
+        :return: the events triggered by the fix
+        """
+        x, y = (fix.x, fix.y) if self.transformer is None else self.transformer.transform(fix.x, fix.y)
+        return self.__push(fix.individual, fix.time, x, y, fix.received)
+
+    def push_batch(self, individual: str, fixes: Iterable[Fix]) -> List[StopEvent]:
+        """ Adds a micro-batch of fixes of one individual, transformed with a single call.
+        :param individual: the individual
+        :param fixes: the fixes in time order
+        :return: the events triggered by the fixes
+        """
+        fixes = list(fixes)
+        xs = np.array([fix.x for fix in fixes], dtype=float)
+        ys = np.array([fix.y for fix in fixes], dtype=float)
+        if self.transformer is not None:
+            xs, ys = self.transformer.transform(xs, ys)
+        events = []
+        for fix, x, y in zip(fixes, xs.tolist(), ys.tolist()):
+            events.extend(self.__push(individual, fix.time, x, y, fix.received))
+        return events
+
+    def open_windows(self) -> Dict[str, int]:
+        """ :return: the number of fixes kept in the open window of each individual """
+        return {individual: len(window) for individual, window in self.windows.items()}
+
+    def __push(self, individual: str, t: pd.Timestamp, x: float, y: float,
+               received: Optional[float]) -> List[StopEvent]:
+        window = self.windows.get(individual)
+        if window is None:
+            window = self.windows[individual] = OpenWindow()
+        elif t <= window.last_time:
+            logging.warning(f'Ignoring fix of {individual} at {t}: not after the previous fix ({window.last_time})')
+            return []
+
+        events = []
+        if window.confirmed and not self.__is_within(window, x, y):
+            events.append(self.__event(STOP_ENDED, individual, window, received))
+            window = self.windows[individual] = OpenWindow()
+
+        window.push(t, x, y)
+        while len(window) > 1 and not self.__is_within(window):
+            window.pop()
+
+        if not window.confirmed and window.last_time - window.start_time >= self.min_duration:
+            events.append(self.__event(STOP_CONFIRMED, individual, window, received))
+            window.confirm()
+        return events
+
+    def __is_within(self, window: OpenWindow, x: Optional[float] = None, y: Optional[float] = None) -> bool:
+        """ Checks if the bounding box of the window (extended by a point) is within the maximum diameter. """
+        minx, miny, maxx, maxy = window.extent()
+        if x is not None:
+            minx, miny, maxx, maxy = min(minx, x), min(miny, y), max(maxx, x), max(maxy, y)
+        if self.is_latlon:
+            diagonal = self.geod.inv(minx, miny, maxx, maxy)[2]
+        else:
+            diagonal = hypot(maxx - minx, maxy - miny)
+        return diagonal < self.max_diameter
+
+    def __event(self, kind: str, individual: str, window: OpenWindow, received: Optional[float]) -> StopEvent:
+        x, y = window.center()
+        if self.transformer is not None:
+            x, y = self.transformer.transform(x, y, direction='INVERSE')
+        return StopEvent(
+            kind=kind,
+            individual=individual,
+            start_time=window.start_time,
+            end_time=window.last_time,
+            duration_s=(window.last_time - window.start_time).total_seconds(),
+            x=x,
+            y=y,
+            latency_s=time.perf_counter() - received if received is not None else None
+        )
+
+
+def trajectory_fixes(trajectory: Trajectory) -> Iterator[Fix]:
+    """ :return: the fixes of a trajectory """
+    geometry = trajectory.df[trajectory.get_geom_col()]
+    individual = str(trajectory.id)
+    for t, x, y in zip(trajectory.df.index, geometry.x.tolist(), geometry.y.tolist()):
+        yield Fix(individual, t, x, y)
+
+
+def replay(data: TrajectoryCollection) -> Iterator[Fix]:
+    """ Replays the fixes of all trajectories of a collection in time order, as they would have been reported.
+    :param data: the collection
+    :return: the fixes of all individuals, ordered by time
+    """
+    return heapq.merge(*[trajectory_fixes(trajectory) for trajectory in data.trajectories], key=lambda fix: fix.time)
+
+
+class QueueSource:
+    """
+    A local stand-in for a stream of incoming fixes: fixes are put into a queue (e.g. by a producer thread) and
+    stamped with the time they were received.
+    """
+
+    def __init__(self, maxsize: int = 0) -> None:
+        """
+        :param maxsize: the maximal number of queued fixes, producers block if the consumer falls behind
+        """
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.closed = object()
+
+    def put(self, fix: Fix) -> None:
+        self.queue.put(fix._replace(received=time.perf_counter()))
+
+    def close(self) -> None:
+        """ Ends the stream after all queued fixes. """
+        self.queue.put(self.closed)
+
+    def feed(self, fixes: Iterable[Fix], interval_s: float = 0.0) -> threading.Thread:
+        """ Puts fixes into the queue from a producer thread and closes the stream afterwards.
+        :param fixes: the fixes
+        :param interval_s: seconds to wait between two fixes
+        :return: the started producer thread
+        """
+        def produce():
+            try:
+                for fix in fixes:
+                    self.put(fix)
+                    if interval_s > 0:
+                        time.sleep(interval_s)
+            finally:
+                self.close()
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        return producer
+
+    def __iter__(self) -> Iterator[Fix]:
+        while True:
+            fix = self.queue.get()
+            if fix is self.closed:
+                return
+            yield fix
+
+
+def detect(source: Iterable[Fix], detector: StreamingStopDetector) -> Iterator[StopEvent]:
+    """ Runs a detector on a stream of fixes.
+    :param source: the fixes, e.g. a `QueueSource` or `replay()` of a collection
+    :param detector: the detector
+    :return: the stop events, as soon as they are detected
+    """
+    for fix in source:
+        yield from detector.push(fix)
@@ -8,9 +8,10 @@ PROJECT_NAME = "co-pilot-python"
 
 class MoveAppsSdk:
 
-    def __init__(self, active_hooks=None) -> None:
+    def __init__(self, active_hooks=None, shard_dir=None) -> None:
         """
         Setup the plugin manager and register all the hooks.
+        If a `shard_dir` is given, the results of the shards in this directory get merged instead of running the app.
         """
         self._pm = pluggy.PluginManager(HOOK_NAMESPACE)
         self._pm.add_hookspecs(MoveAppsSpec)
@@ -20,11 +21,46 @@ class MoveAppsSdk:
                 self._pm.register(hook)
 
         executor = MoveAppsExecutor(plugin_manager=self._pm)
-        executor.execute()
+        if shard_dir:
+            executor.merge(shard_dir)
+        else:
+            executor.execute()
 
 
 if __name__ == "__main__":
-    from app.app import App
-    # LIFO
-    hooks = [App(moveapps_io=MoveAppsIo())]
-    sdk = MoveAppsSdk(active_hooks=hooks)
+    import argparse
+    import os
+    from dotenv import load_dotenv
+    from sdk.moveapps_sharding import split_source_file, get_shard_environment
+
+    parser = argparse.ArgumentParser(description='Runs the app. Without a command the app runs on the SOURCE_FILE.')
+    commands = parser.add_subparsers(dest='command')
+    split_command = commands.add_parser('split', help='split the SOURCE_FILE by trajectory into shards')
+    split_command.add_argument('--shards', type=int, required=True, help='the maximal number of shards')
+    split_command.add_argument('--shard-dir', required=True, help='the directory to create the shards in')
+    shard_command = commands.add_parser('shard', help='run the app on a single shard')
+    shard_command.add_argument('shard_path', help='the shard directory (e.g. `<shard-dir>/shard-000`)')
+    merge_command = commands.add_parser('merge', help='merge the results of all shards into the output')
+    merge_command.add_argument('--shard-dir', required=True, help='the directory containing the shards')
+    worker_command = commands.add_parser('worker', help='run the jobs of a job directory in a long-living process')
+    worker_command.add_argument('--job-dir', required=True, help='the job directory')
+    worker_command.add_argument('--poll-interval', type=float, default=1.0, help='seconds to wait for new jobs')
+    args = parser.parse_args()
+
+    if args.command == 'split':
+        load_dotenv()
+        split_source_file(os.environ['SOURCE_FILE'], args.shards, args.shard_dir)
+    elif args.command == 'worker':
+        from sdk.moveapps_worker import MoveAppsWorker
+        from app.app import App
+        # every job gets a new App: no state is shared between the jobs
+        worker = MoveAppsWorker(hook_factory=lambda: [App(moveapps_io=MoveAppsIo())], job_dir=args.job_dir,
+                                preload_modules=['pandas', 'geopandas', 'movingpandas', 'folium'])
+        worker.run(poll_interval=args.poll_interval)
+    else:
+        if args.command == 'shard':
+            os.environ.update(get_shard_environment(args.shard_path))
+        from app.app import App
+        # LIFO
+        hooks = [App(moveapps_io=MoveAppsIo())]
+        sdk = MoveAppsSdk(active_hooks=hooks, shard_dir=args.shard_dir if args.command == 'merge' else None)
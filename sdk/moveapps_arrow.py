@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from movingpandas import TrajectoryCollection
+
+# Arrow IPC files, detected by the file extension of the input/output file
+ARROW_EXTENSIONS = ('.arrow', '.feather')
+
+# the geometry is stored as coordinate arrays
+X_COLUMN = '__geometry_x'
+Y_COLUMN = '__geometry_y'
+METADATA_KEY = b'moveapps'
+
+
+def is_arrow_file(path: str) -> bool:
+    """
+    :param path: path of an input or output file
+    :return: whether the file is (to be) an Arrow IPC file
+    """
+    return path is not None and path.lower().endswith(ARROW_EXTENSIONS)
+
+
+def write_arrow(data: TrajectoryCollection, path: str) -> None:
+    """
+    Writes a TrajectoryCollection as a single Arrow IPC table. The trajectories are stored one after the other,
+    the point geometries as x/y coordinate arrays and the time index as a column.
+
+    :param data: the collection to write
+    :param path: the Arrow IPC file
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import shapely
+    from pyproj import CRS
+
+    trajectories = data.trajectories
+    traj_id_col = data.get_traj_id_col() if trajectories else None
+    time_col = (trajectories[0].df.index.name or 't') if trajectories else 't'
+    crs = trajectories[0].crs if trajectories else None
+    metadata = {
+        'traj_id_col': traj_id_col,
+        'time_col': time_col,
+        'traj_ids': [traj.id for traj in trajectories],
+        'obj_ids': [traj.obj_id for traj in trajectories],
+        'lengths': [len(traj.df) for traj in trajectories],
+        'crs': CRS.from_user_input(crs).to_wkt() if crs is not None else None
+    }
+    if trajectories:
+        df = pd.concat([traj.df for traj in trajectories])
+        coordinates = shapely.get_coordinates(df.geometry.values)
+        df = pd.DataFrame(df.drop(columns=df.geometry.name))
+        df.index = df.index.rename(time_col)
+        df = df.reset_index()
+        df[X_COLUMN] = coordinates[:, 0]
+        df[Y_COLUMN] = coordinates[:, 1]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    else:
+        table = pa.table({})
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           METADATA_KEY: json.dumps(metadata).encode()})
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow(path: str) -> TrajectoryCollection:
+    """
+    Reads a TrajectoryCollection written by `write_arrow()`.
+    The file is memory mapped and converted to pandas once, every trajectory is a slice of it.
+
+    :param path: the Arrow IPC file
+    :return: the collection
+    """
+    import pyarrow as pa
+    import shapely
+    from geopandas import GeoDataFrame
+    from movingpandas import Trajectory, TrajectoryCollection
+
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+
+    collection = TrajectoryCollection([])
+    if not metadata['traj_ids']:
+        return collection
+    # free the Arrow buffers while converting
+    df = table.to_pandas(self_destruct=True)
+    del table
+    geometry = shapely.points(df.pop(X_COLUMN).values, df.pop(Y_COLUMN).values)
+    df = GeoDataFrame(df.set_index(metadata['time_col']), geometry=geometry, crs=metadata['crs'])
+
+    trajectories = []
+    start = 0
+    for traj_id, obj_id, length in zip(metadata['traj_ids'], metadata['obj_ids'], metadata['lengths']):
+        trajectories.append(Trajectory(df.iloc[start:start + length], traj_id,
+                                       traj_id_col=metadata['traj_id_col'], obj_id=obj_id))
+        start += length
+    # not passed to the constructor: its length filter would compute the length of every trajectory
+    collection.trajectories = trajectories
+    return collection
@@ -1,10 +1,10 @@
-import pandas as pd
 import json
 import os
 import logging
 import pluggy
 from dotenv import load_dotenv
 from dataclasses import dataclass
+from sdk.moveapps_arrow import is_arrow_file, read_arrow, write_arrow
 
 
 @dataclass
@@ -25,6 +25,7 @@ class MoveAppsExecutor:
         try:
             self.__configure_logging()
             self.__load_environment()
+            self.__validate_config()
             data = self.__load_input()
             output = self.__call_app(data)
             self.__store_output(output)
@@ -32,6 +33,19 @@ class MoveAppsExecutor:
             self.__store_error(exception)
             raise exception
 
+    def merge(self, shard_dir: str):
+        try:
+            self.__configure_logging()
+            self.__load_environment()
+            self.__validate_config()
+            from sdk.moveapps_sharding import load_shards
+            data, artifact_dirs = load_shards(shard_dir)
+            output = self.__call_merge(data, artifact_dirs)
+            self.__store_output(output)
+        except Exception as exception:
+            self.__store_error(exception)
+            raise exception
+
     def __load_environment(self):
         self.env = Environment(
             source_file=os.environ.get('SOURCE_FILE'),
@@ -48,7 +62,14 @@ class MoveAppsExecutor:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
 
+    def __validate_config(self):
+        self._pm.hook.validate_config(config=self.env.app_configuration)
+
     def __load_input(self):
+        if is_arrow_file(self.env.source_file):
+            return read_arrow(self.env.source_file)
+        # pandas (and the geospatial dependencies of the pickled data) get imported only now
+        import pandas as pd
         return pd.read_pickle(self.env.source_file)
 
     @staticmethod
@@ -65,7 +86,11 @@ class MoveAppsExecutor:
 
     def __store_output(self, data):
         logging.info(f'storing output: {data}')
-        pd.to_pickle(data, self.env.output_file)
+        if is_arrow_file(self.env.output_file):
+            write_arrow(data, self.env.output_file)
+        else:
+            import pandas as pd
+            pd.to_pickle(data, self.env.output_file)
 
     def __store_error(self, error: Exception):
         logging.info(f'storing error to {self.env.error_file}')
@@ -75,3 +100,7 @@ class MoveAppsExecutor:
     def __call_app(self, data):
         outputs = self._pm.hook.execute(data=data, config=self.env.app_configuration)
         return outputs[0]
+
+    def __call_merge(self, data, artifact_dirs):
+        outputs = self._pm.hook.merge_shards(data=data, artifact_dirs=artifact_dirs, config=self.env.app_configuration)
+        return outputs[0]
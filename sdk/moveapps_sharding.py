@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from copy import copy
+from typing import List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from movingpandas import Trajectory, TrajectoryCollection
+
+MANIFEST_FILE = 'manifest.json'
+SHARD_INPUT_FILE = 'input.pickle'
+SHARD_OUTPUT_FILE = 'output.pickle'
+SHARD_ERROR_FILE = 'error.txt'
+
+
+def partition_trajectories(trajectories: List[Trajectory], shard_count: int) -> List[List[Trajectory]]:
+    """
+    Partitions trajectories into shards of similar size (number of observations).
+    Every trajectory is assigned to exactly one shard, the input order is kept within a shard.
+
+    :param trajectories: the trajectories to partition
+    :param shard_count: the maximal number of shards
+    :return: the non-empty shards
+    """
+    if shard_count < 1:
+        raise ValueError(f'At least one shard is required, got {shard_count}')
+    assignments = [0] * len(trajectories)
+    loads = [0] * shard_count
+    # largest trajectories first, each into the currently smallest shard
+    for i in sorted(range(len(trajectories)), key=lambda idx: len(trajectories[idx].df), reverse=True):
+        shard = loads.index(min(loads))
+        assignments[i] = shard
+        loads[shard] += len(trajectories[i].df)
+    shards = [[traj for traj, shard in zip(trajectories, assignments) if shard == s] for s in range(shard_count)]
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def with_trajectories(data: TrajectoryCollection, trajectories: List[Trajectory]) -> TrajectoryCollection:
+    """
+    Creates a collection like `data` containing the given trajectories.
+    The trajectories are taken as they are (no copy, no filtering by length).
+
+    :param data: the collection to take the collection settings from
+    :param trajectories: the trajectories of the new collection
+    :return: the new collection
+    """
+    collection = copy(data)
+    collection.trajectories = trajectories
+    return collection
+
+
+def split_source_file(source_file: str, shard_count: int, shard_dir: str) -> List[str]:
+    """
+    Splits the input data of an app by trajectory into shards. Every shard is a directory in `shard_dir` containing
+    the shard input. A shard can be run by the SDK like any other app input (see `get_shard_environment()`) and
+    stores its output and artifacts in its own directory.
+
+    :param source_file: the input data (a pickled TrajectoryCollection or an Arrow IPC file)
+    :param shard_count: the maximal number of shards
+    :param shard_dir: the directory to create the shards in
+    :return: paths of the created shard directories
+    """
+    import pandas as pd
+    from sdk.moveapps_arrow import is_arrow_file, read_arrow
+
+    data: TrajectoryCollection = read_arrow(source_file) if is_arrow_file(source_file) else pd.read_pickle(source_file)
+    shards = partition_trajectories(data.trajectories, shard_count)
+    shard_paths = []
+    for i, trajectories in enumerate(shards):
+        shard_path = os.path.join(shard_dir, f'shard-{i:03d}')
+        os.makedirs(shard_path, exist_ok=True)
+        pd.to_pickle(with_trajectories(data, trajectories), os.path.join(shard_path, SHARD_INPUT_FILE))
+        shard_paths.append(shard_path)
+    with open(os.path.join(shard_dir, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump({
+            'shards': [os.path.basename(shard_path) for shard_path in shard_paths],
+            'trajectory_ids': [str(traj.id) for traj in data.trajectories]
+        }, manifest_file, indent=2)
+    logging.info(f'split {len(data.trajectories)} trajectories of {source_file} into {len(shards)} shards')
+    return shard_paths
+
+
+def get_shard_environment(shard_path: str) -> dict:
+    """
+    Provides the SDK environment variables to run the app on a single shard.
+
+    :param shard_path: the shard directory
+    :return: environment variables pointing input, output, error and artifacts to the shard directory
+    """
+    return {
+        'SOURCE_FILE': os.path.join(shard_path, SHARD_INPUT_FILE),
+        'OUTPUT_FILE': os.path.join(shard_path, SHARD_OUTPUT_FILE),
+        'ERROR_FILE': os.path.join(shard_path, SHARD_ERROR_FILE),
+        'APP_ARTIFACTS_DIR': shard_path
+    }
+
+
+def load_shards(shard_dir: str) -> Tuple[TrajectoryCollection, List[str]]:
+    """
+    Loads the shards created by `split_source_file()`.
+
+    :param shard_dir: the directory containing the shards
+    :return: the combined input data of all shards (in the order of the original input)
+        and the artifact directories of the shards
+    """
+    import pandas as pd
+
+    with open(os.path.join(shard_dir, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    shard_paths = [os.path.join(shard_dir, shard) for shard in manifest['shards']]
+    trajectories = {}
+    shard = None
+    for shard_path in shard_paths:
+        if not os.path.exists(os.path.join(shard_path, SHARD_OUTPUT_FILE)):
+            raise FileNotFoundError(f'Shard {shard_path} has no output. Did the shard run complete?')
+        shard: TrajectoryCollection = pd.read_pickle(os.path.join(shard_path, SHARD_INPUT_FILE))
+        trajectories.update({str(traj.id): traj for traj in shard.trajectories})
+    data = with_trajectories(shard, [trajectories[traj_id] for traj_id in manifest['trajectory_ids']])
+    return data, shard_paths
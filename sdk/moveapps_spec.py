@@ -1,5 +1,11 @@
+from __future__ import annotations
+
+from typing import List, TYPE_CHECKING
+
 import pluggy
-from movingpandas import TrajectoryCollection
+
+if TYPE_CHECKING:
+    from movingpandas import TrajectoryCollection
 
 HOOK_NAMESPACE = "co-pilot-python"
 hook_spec = pluggy.HookspecMarker(HOOK_NAMESPACE)
@@ -7,6 +13,17 @@ hook_impl = pluggy.HookimplMarker(HOOK_NAMESPACE)
 
 
 class MoveAppsSpec(object):
+    @hook_spec
+    def validate_config(self, config: dict) -> None:
+        """Validates the configuration before the input data gets loaded (optional)
+
+        Raise an exception for an invalid configuration to let the app run fail early.
+        Keep it cheap: avoid importing heavy dependencies for the validation.
+
+        :param config: the configuration of your app. Values are set by the MoveApps workflow user.
+        """
+        pass
+
     @hook_spec
     def execute(self, data: TrajectoryCollection, config: dict) -> TrajectoryCollection:
         """Invokes your main business logic
@@ -16,3 +33,14 @@ class MoveAppsSpec(object):
         :return: data for any next app in the workflow
         """
         pass
+
+    @hook_spec
+    def merge_shards(self, data: TrajectoryCollection, artifact_dirs: List[str], config: dict) -> TrajectoryCollection:
+        """Merges the results of an app run on several shards of the input data (optional)
+
+        :param data: the combined input data of all shards.
+        :param artifact_dirs: the directories containing the artifacts created by each shard run.
+        :param config: the configuration of your app. Values are set by the MoveApps workflow user.
+        :return: data for any next app in the workflow, like a single app run on the whole input would return it
+        """
+        pass
@@ -0,0 +1,138 @@
+import importlib
+import json
+import logging
+import os
+import time
+from typing import Callable, List, Optional, Sequence
+
+import pluggy
+from sdk.moveapps_spec import MoveAppsSpec, HOOK_NAMESPACE
+from sdk.moveapps_execution import MoveAppsExecutor
+
+PENDING_DIR = 'pending'
+RUNNING_DIR = 'running'
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+
+
+class MoveAppsWorker:
+
+    def __init__(self, hook_factory: Callable[[], List[object]], job_dir: str,
+                 preload_modules: Sequence[str] = ()) -> None:
+        """
+        A long-living process running many app jobs, paying the import and startup costs only once.
+        Jobs are JSON files put into `<job_dir>/pending`:
+        - `source_file`: path to the input file of the job (required)
+        - `artifacts_dir`: directory for the artifacts of the job (required)
+        - `config`: the app configuration (or `configuration_file`: path to it)
+        - `output_file`: defaults to `<artifacts_dir>/output.pickle`
+        - `error_file`: defaults to `<artifacts_dir>/error.txt`
+        A claimed job is moved to `running` and afterwards to `done` or `failed`.
+
+        :param hook_factory: creates the hooks for a job. Every job gets new hooks to isolate the state of the jobs.
+        :param job_dir: the job directory
+        :param preload_modules: modules to import on startup (e.g. the heavy dependencies of the app)
+        """
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+        self.hook_factory = hook_factory
+        self.job_dir = job_dir
+        for sub_dir in [PENDING_DIR, RUNNING_DIR, DONE_DIR, FAILED_DIR]:
+            os.makedirs(os.path.join(job_dir, sub_dir), exist_ok=True)
+        for module in preload_modules:
+            importlib.import_module(module)
+
+    def run(self, poll_interval: float = 1.0, stop_when_idle: bool = False) -> int:
+        """
+        Runs the pending jobs and waits for new ones.
+
+        :param poll_interval: seconds to wait for new jobs
+        :param stop_when_idle: stop as soon as there are no pending jobs
+        :return: the number of processed jobs
+        """
+        logging.info(f'worker is waiting for jobs in {os.path.join(self.job_dir, PENDING_DIR)}')
+        processed = 0
+        while True:
+            job_file = self.__claim_next_job()
+            if job_file is None:
+                if stop_when_idle:
+                    return processed
+                time.sleep(poll_interval)
+                continue
+            self.run_job(job_file)
+            processed += 1
+
+    def run_job(self, job_file: str) -> bool:
+        """
+        Runs a single claimed job with new hooks and the environment of the job.
+
+        :param job_file: the job file (in `running`)
+        :return: whether the job succeeded
+        """
+        job_name = os.path.basename(job_file)
+        started = time.perf_counter()
+        environment = os.environ.copy()
+        try:
+            with open(job_file) as f:
+                job = json.load(f)
+            os.environ.update(self.__job_environment(job, job_file))
+            pm = pluggy.PluginManager(HOOK_NAMESPACE)
+            pm.add_hookspecs(MoveAppsSpec)
+            for hook in self.hook_factory():
+                pm.register(hook)
+            MoveAppsExecutor(plugin_manager=pm).execute()
+            succeeded = True
+        except Exception as exception:
+            logging.exception(f'job {job_name} failed: {exception}')
+            succeeded = False
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+            if os.path.exists(self.__configuration_file(job_file)):
+                os.remove(self.__configuration_file(job_file))
+        logging.info(f'job {job_name} finished after {time.perf_counter() - started:.2f}s')
+        os.rename(job_file, os.path.join(self.job_dir, DONE_DIR if succeeded else FAILED_DIR, job_name))
+        return succeeded
+
+    def __claim_next_job(self) -> Optional[str]:
+        pending_dir = os.path.join(self.job_dir, PENDING_DIR)
+        job_files = []
+        for job_file in os.listdir(pending_dir):
+            if not job_file.endswith('.json'):
+                continue
+            try:
+                job_files.append((os.path.getmtime(os.path.join(pending_dir, job_file)), job_file))
+            except FileNotFoundError:
+                # claimed by another worker since listing the directory
+                continue
+        for _, job_file in sorted(job_files):
+            running = os.path.join(self.job_dir, RUNNING_DIR, job_file)
+            try:
+                # atomic: several workers can share a job directory
+                os.rename(os.path.join(pending_dir, job_file), running)
+                return running
+            except FileNotFoundError:
+                continue
+        return None
+
+    @staticmethod
+    def __configuration_file(job_file: str) -> str:
+        return f'{os.path.splitext(job_file)[0]}.configuration'
+
+    def __job_environment(self, job: dict, job_file: str) -> dict:
+        artifacts_dir = job['artifacts_dir']
+        os.makedirs(artifacts_dir, exist_ok=True)
+        environment = {
+            'SOURCE_FILE': job['source_file'],
+            'APP_ARTIFACTS_DIR': artifacts_dir,
+            'OUTPUT_FILE': job.get('output_file', os.path.join(artifacts_dir, 'output.pickle')),
+            'ERROR_FILE': job.get('error_file', os.path.join(artifacts_dir, 'error.txt')),
+        }
+        if 'configuration_file' in job:
+            environment['CONFIGURATION_FILE'] = job['configuration_file']
+        else:
+            # always as file: a `CONFIGURATION_FILE` (e.g. loaded from `.env`) takes precedence over `CONFIGURATION`
+            config_file = self.__configuration_file(job_file)
+            with open(config_file, 'w') as f:
+                json.dump(job.get('config', {}), f)
+            environment['CONFIGURATION_FILE'] = config_file
+        return environment
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from movingpandas import Trajectory, TrajectoryCollection
+from pyproj import Transformer
+
+
+@dataclass
+class PlantedStop:
+    traj_id: str
+    start_time: pd.Timestamp
+    end_time: pd.Timestamp
+    # the largest distance between two fixes of the stop, in meters
+    diameter_m: float
+
+
+class SyntheticTrajectories:
+
+    def __init__(self, individuals: int = 3, points_per_individual: int = 1000,
+                 fix_interval: timedelta = timedelta(hours=1), stops_per_individual: int = 2,
+                 stop_duration: timedelta = timedelta(hours=48), stop_diameter_m: float = 50, step_m: float = 500,
+                 crs: str = 'EPSG:4326', seed: int = 0) -> None:
+        """
+        Generates deterministic trajectories with planted stops: the individuals move with steps of `step_m` meters
+        (in a random direction) and rest within `stop_diameter_m` meters for `stop_duration`.
+        The stops are spread evenly over the trajectory, the last fixes are always moving.
+
+        :param individuals: the number of trajectories
+        :param points_per_individual: the number of fixes of each trajectory
+        :param fix_interval: the time between two fixes
+        :param stops_per_individual: the number of stops of each trajectory
+        :param stop_duration: the duration of each stop
+        :param stop_diameter_m: the maximal diameter of each stop
+        :param step_m: the distance between two fixes while moving
+        :param crs: 'EPSG:4326' or a projected CRS with meters as unit
+        :param seed: the seed of the random movement
+        """
+        self.individuals = individuals
+        self.points_per_individual = points_per_individual
+        self.fix_interval = fix_interval
+        self.stops_per_individual = stops_per_individual
+        self.stop_points = int(stop_duration / fix_interval) + 1
+        self.stop_diameter_m = stop_diameter_m
+        self.step_m = step_m
+        self.crs = crs
+        self.seed = seed
+        if self.stops_per_individual * (self.stop_points + 2) >= points_per_individual:
+            raise ValueError(f'{points_per_individual} points cannot contain {stops_per_individual} stops '
+                             f'of {self.stop_points} points')
+
+    def generate(self) -> Tuple[TrajectoryCollection, List[PlantedStop]]:
+        """
+        :return: the trajectories and their planted stops
+        """
+        rng = np.random.default_rng(self.seed)
+        trajectories = []
+        planted = []
+        for i in range(self.individuals):
+            traj_id = f'synthetic_{i}'
+            xs, ys, stop_ranges = self.__movement(rng)
+            times = pd.Timestamp('2020-01-01') + self.fix_interval * np.arange(self.points_per_individual)
+            df = gpd.GeoDataFrame({'individual': traj_id}, geometry=self.__points(xs, ys, i),
+                                  index=pd.DatetimeIndex(times, name='timestamp'), crs=self.crs)
+            trajectories.append(Trajectory(df, traj_id, obj_id=traj_id))
+            for start, end in stop_ranges:
+                diameter = max(np.hypot(xs[start:end + 1, None] - xs[None, start:end + 1],
+                                        ys[start:end + 1, None] - ys[None, start:end + 1]).max(), 0)
+                planted.append(PlantedStop(traj_id, times[start], times[end], diameter))
+        return TrajectoryCollection(trajectories), planted
+
+    def __movement(self, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, List[Tuple[int, int]]]:
+        """ Local coordinates in meters and the first and last position of each stop. """
+        n = self.points_per_individual
+        # moving steps
+        headings = rng.uniform(0, 2 * np.pi, n)
+        dx = self.step_m * np.cos(headings)
+        dy = self.step_m * np.sin(headings)
+        dx[0] = dy[0] = 0
+
+        stop_ranges = []
+        gap = (n - self.stops_per_individual * self.stop_points) // (self.stops_per_individual + 1)
+        for k in range(self.stops_per_individual):
+            start = gap * (k + 1) + self.stop_points * k
+            stop_ranges.append((start, start + self.stop_points - 1))
+            # the stop: no movement, jitter is added afterwards
+            dx[start + 1:start + self.stop_points] = 0
+            dy[start + 1:start + self.stop_points] = 0
+
+        xs = np.cumsum(dx)
+        ys = np.cumsum(dy)
+        # jitter within a circle of 45% of the diameter: all fixes of a stop are closer than the diameter
+        radius = 0.45 * self.stop_diameter_m * np.sqrt(rng.uniform(0, 1, n))
+        angles = rng.uniform(0, 2 * np.pi, n)
+        for start, end in stop_ranges:
+            xs[start:end + 1] += radius[start:end + 1] * np.cos(angles[start:end + 1])
+            ys[start:end + 1] += radius[start:end + 1] * np.sin(angles[start:end + 1])
+        return xs, ys, stop_ranges
+
+    def __points(self, xs: np.ndarray, ys: np.ndarray, individual: int) -> np.ndarray:
+        """ Places the local coordinates of an individual in the CRS. """
+        if self.crs == 'EPSG:4326':
+            # azimuthal equidistant around a center per individual: the local distances are kept
+            lon, lat = 10 + individual, 50
+            local = Transformer.from_crs(f'+proj=aeqd +lat_0={lat} +lon_0={lon} +datum=WGS84 +units=m', self.crs,
+                                         always_xy=True)
+            return shapely.points(*local.transform(xs, ys))
+        return shapely.points(500000 + 100000 * individual + xs, 5000000 + ys)
@@ -1,8 +1,14 @@
+import json
+import subprocess
+import sys
+import tempfile
 import unittest
 import os
+from unittest import mock
 from tests.config.definitions import ROOT_DIR
 from app.app import App
 from sdk.moveapps_io import MoveAppsIo
+from sdk.moveapps_sharding import get_shard_environment, split_source_file, load_shards
 import pandas as pd
 import movingpandas as mpd
 
@@ -55,3 +61,249 @@ class MyTestCase(unittest.TestCase):
         self.setUp()
         final_stops_only = self.sut.execute(data=input, config=config)
         self.assertEqual(actual.trajectories, final_stops_only.trajectories)
+
+    def test_merge_shards(self):
+        """ A test for if merged shard runs (in separate processes) produce the same results as a single run. """
+        # prepare
+        source_file = os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle')
+        config: dict = {
+            "min_duration_hours": 30,
+            "max_diameter_meters": 100,
+            "final_stops_only": False,
+            "return_data": "trajectories"
+        }
+        expected = self.sut.execute(data=pd.read_pickle(source_file), config=config)
+        expected_stops = self.sut.all_stop_points
+        expected_summary = self.sut.stop_summary
+
+        with tempfile.TemporaryDirectory() as shard_dir:
+            config_file = os.path.join(shard_dir, 'config.json')
+            with open(config_file, 'w') as f:
+                json.dump(config, f)
+            shards = split_source_file(source_file, 2, shard_dir)
+            processes = [
+                subprocess.Popen([sys.executable, 'sdk.py', 'shard', shard], cwd=ROOT_DIR,
+                                 env=dict(os.environ, CONFIGURATION_FILE=config_file),
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                for shard in shards
+            ]
+            self.assertEqual([0, 0], [process.wait() for process in processes])
+            data, artifact_dirs = load_shards(shard_dir)
+
+            # execute: the merge combines the shard results, the movement is not computed again
+            self.setUp()
+            with mock.patch.object(App, 'get_movement', side_effect=AssertionError('movement computed')):
+                actual = self.sut.merge_shards(data=data, artifact_dirs=artifact_dirs, config=config)
+
+        # verify
+        self.assertEqual(expected.trajectories, actual.trajectories)
+        self.assertEqual(expected_stops.index.tolist(), self.sut.all_stop_points.index.tolist())
+        self.assertEqual(expected_stops['distance_traveled_since_stop_began'].tolist(),
+                         self.sut.all_stop_points['distance_traveled_since_stop_began'].tolist())
+        self.assertEqual(expected_stops['traj_id'].tolist(), self.sut.all_stop_points['traj_id'].tolist())
+        self.assertEqual(expected_summary['stop_count'].tolist(), self.sut.stop_summary['stop_count'].tolist())
+
+    def test_merge_projected_shards(self):
+        """ A test for if merged shard runs of projected data write the stops and return the input data of a single
+        run. """
+        # prepare
+        source_file = os.path.join(ROOT_DIR, 'resources/samples/input3_Mollweide.pickle')
+        config: dict = {
+            "min_duration_hours": 24,
+            "max_diameter_meters": 200,
+            "final_stops_only": False,
+            "return_data": "input_data"
+        }
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            single_dir = os.path.join(artifacts_dir, 'single')
+            expected, = self.sut.execute_batch([(pd.read_pickle(source_file), config, single_dir)])
+            shard_dir = os.path.join(artifacts_dir, 'shards')
+            shards = split_source_file(source_file, 2, shard_dir)
+            for shard, output in zip(shards, self.sut.execute_batch(
+                    [(pd.read_pickle(get_shard_environment(shard)['SOURCE_FILE']), config, shard) for shard in shards])):
+                pd.to_pickle(output, get_shard_environment(shard)['OUTPUT_FILE'])
+            data, artifact_dirs = load_shards(shard_dir)
+            merged_dir = os.path.join(artifacts_dir, 'merged')
+            os.makedirs(merged_dir)
+            os.environ['APP_ARTIFACTS_DIR'] = merged_dir
+
+            # execute
+            actual = self.sut.merge_shards(data=data, artifact_dirs=artifact_dirs, config=config)
+
+            # verify: the stop geometries are not transformed back and forth
+            for file_name in ['all_stops.csv', 'final_stops.csv']:
+                with open(os.path.join(single_dir, file_name)) as expected_file, \
+                        open(os.path.join(merged_dir, file_name)) as actual_file:
+                    self.assertEqual(expected_file.read(), actual_file.read())
+            self.assertTrue(os.path.exists(os.path.join(merged_dir, 'map.html')))
+        # the input data is returned as it is
+        self.assertEqual([list(tr.df.columns) for tr in expected.trajectories],
+                         [list(tr.df.columns) for tr in actual.trajectories])
+        self.assertNotIn('speed', actual.trajectories[0].df.columns)
+
+    def test_stop_summary(self):
+        """ A test for if the stop summary matches the stop table of the run. """
+        # prepare
+        input: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        config: dict = {
+            "min_duration_hours": 30,
+            "max_diameter_meters": 100,
+            "final_stops_only": False,
+            "stop_summary_format": "parquet"
+        }
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            os.environ['APP_ARTIFACTS_DIR'] = artifacts_dir
+
+            # execute
+            self.sut.execute(data=input, config=config)
+            written = pd.read_parquet(os.path.join(artifacts_dir, 'stop_summary.parquet'))
+
+        # verify
+        summary = self.sut.stop_summary
+        stops = self.sut.all_stop_points
+        # trajectories without stops are part of the summary
+        self.assertEqual([tr.id for tr in input.trajectories], summary.index.tolist())
+        self.assertEqual(stops.groupby('traj_id').size().reindex(summary.index, fill_value=0).tolist(),
+                         summary['stop_count'].tolist())
+        self.assertEqual(stops.groupby('traj_id')['duration_s'].sum().reindex(summary.index, fill_value=0).tolist(),
+                         summary['total_duration_s'].tolist())
+        final_stops = self.sut.final_stop_points.set_index('traj_id')
+        with_stops = summary[summary['stop_count'] > 0]
+        self.assertEqual(final_stops.loc[with_stops.index, 'start_time'].tolist(),
+                         with_stops['final_stop_start_time'].tolist())
+        self.assertEqual(final_stops.loc[with_stops.index, 'distance_traveled_since_stop_began'].tolist(),
+                         with_stops['distance_since_final_stop_began_m'].tolist())
+        self.assertEqual((final_stops.loc[with_stops.index, 'time_tracked_since_stop_began'].dt.total_seconds()
+                          .tolist()), with_stops['time_since_final_stop_began_s'].tolist())
+        pd.testing.assert_frame_equal(summary, written)
+
+    def test_memory_budget(self):
+        """ A test for if runs within a small memory budget detect the same stops and degrade the map. """
+        # prepare
+        input: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        config: dict = {
+            "min_duration_hours": 30,
+            "max_diameter_meters": 100,
+            "final_stops_only": False
+        }
+        self.sut.execute(data=input, config=config)
+        expected_stops = self.sut.all_stop_points
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            os.environ['APP_ARTIFACTS_DIR'] = artifacts_dir
+
+            # execute
+            self.sut = App(moveapps_io=MoveAppsIo())
+            self.sut.execute(data=input, config={**config, "memory_budget_mb": 6})
+
+            # verify
+            self.assertEqual('windowed', self.sut.execution_plan.strategy)
+            self.assertIn(self.sut.execution_plan.map_strategy, ['simplified', 'stops_only', 'skipped'])
+            self.assertIsNotNone(self.sut.execution_plan.peak_bytes)
+            pd.testing.assert_frame_equal(expected_stops, self.sut.all_stop_points)
+            # the segments after the stops are not the output data: only the map keeps their positions
+            self.assertEqual([], self.sut.trajectories_after_all_stops)
+            self.assertTrue(self.sut.map_segments)
+
+    def test_validate_config_invalid(self):
+        # execute
+        with self.assertRaises(AssertionError):
+            self.sut.validate_config(config={"max_diameter_meters": -1})
+
+    def test_startup_without_heavy_imports(self):
+        """ Importing the App and validating its configuration must not load the geospatial dependencies. """
+        # prepare
+        code = 'import sys; from app.app import App; from sdk.moveapps_io import MoveAppsIo; ' \
+               'App(moveapps_io=MoveAppsIo()).validate_config({}); ' \
+               'print([m for m in ["pandas", "geopandas", "movingpandas", "folium"] if m in sys.modules])'
+
+        # execute
+        actual = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+
+        # verify
+        self.assertEqual('[]', actual.stdout.strip())
+
+    def test_empty_map_without_folium(self):
+        """ A run without stops must not load folium for its empty map. """
+        # prepare
+        code = 'import os, sys; import pandas as pd; from app.app import App; from sdk.moveapps_io import MoveAppsIo; ' \
+               'App(moveapps_io=MoveAppsIo()).execute(data=pd.read_pickle("tests/resources/app/input3.pickle"), ' \
+               'config={}); print("folium" in sys.modules)'
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            # execute
+            actual = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True,
+                                    check=True, env=dict(os.environ, APP_ARTIFACTS_DIR=artifacts_dir))
+
+            # verify
+            self.assertTrue(os.path.exists(os.path.join(artifacts_dir, 'empty_map.html')))
+        self.assertEqual('False', actual.stdout.strip())
+
+    def test_execute_batch(self):
+        """ A test for if runs of a batch do not share their results. """
+        # prepare
+        input2: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        input3: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input3.pickle'))
+        expected: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR,
+                                                                         'tests/resources/output/output.pickle'))
+        config: dict = {
+            "min_duration_hours": 30,
+            "max_diameter_meters": 100,
+            "return_data": "trajectories"
+        }
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            runs = [
+                (input2, config, os.path.join(artifacts_dir, 'input2')),
+                (input3, {}, os.path.join(artifacts_dir, 'input3'))
+            ]
+
+            # execute
+            actual = self.sut.execute_batch(runs)
+
+            # verify
+            self.assertEqual(expected.trajectories, actual[0].trajectories)
+            self.assertIs(input3, actual[1])
+            self.assertEqual(2, len(pd.read_csv(os.path.join(artifacts_dir, 'input2', 'final_stops.csv'))))
+            self.assertTrue(os.path.exists(os.path.join(artifacts_dir, 'input2', 'map.html')))
+            self.assertTrue(os.path.exists(os.path.join(artifacts_dir, 'input3', 'empty_map.html')))
+        # results are released after the runs
+        self.assertIsNone(self.sut.final_stop_points)
+        self.assertEqual([], self.sut.trajectories_after_final_stop)
+        self.assertEqual(os.path.join(ROOT_DIR, 'tests/resources/output'), os.environ['APP_ARTIFACTS_DIR'])
+
+    def test_projected_input(self):
+        """ A test for if projected data gives the stops of the same data in lat/lon, in the CRS of the input. """
+        # prepare
+        projected: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR,
+                                                                          'resources/samples/input3_Mollweide.pickle'))
+        lat_lon: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR,
+                                                                       'resources/samples/input3_LatLon.pickle'))
+        config: dict = {
+            "min_duration_hours": 24,
+            "max_diameter_meters": 200,
+            "final_stops_only": False,
+            "return_data": "trajectories"
+        }
+
+        with tempfile.TemporaryDirectory() as artifacts_dir:
+            runs = [
+                (projected, config, os.path.join(artifacts_dir, 'projected')),
+                (lat_lon, config, os.path.join(artifacts_dir, 'lat_lon'))
+            ]
+
+            # execute
+            actual_projected, actual_lat_lon = self.sut.execute_batch(runs)
+
+            # verify
+            stops_projected = self.sut.read_stops_csv(os.path.join(artifacts_dir, 'projected', 'all_stops.csv'))
+            stops_lat_lon = self.sut.read_stops_csv(os.path.join(artifacts_dir, 'lat_lon', 'all_stops.csv'))
+        self.assertEqual(2, len(stops_projected))
+        self.assertEqual(list(stops_lat_lon['start_time']), list(stops_projected['start_time']))
+        self.assertEqual(list(stops_lat_lon['traj_id']), list(stops_projected['traj_id']))
+        # the stops are in the CRS of the input (meters instead of degrees)
+        self.assertGreater(stops_projected.geometry.x.abs().min(), 1000)
+        self.assertEqual(projected.trajectories[0].crs, actual_projected.trajectories[0].crs)
+        self.assertEqual(len(actual_lat_lon.trajectories), len(actual_projected.trajectories))
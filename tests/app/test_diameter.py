@@ -0,0 +1,66 @@
+import itertools
+import math
+import random
+import unittest
+
+from app.diameter import WindowHull, convex_hull, hull_diameter, is_degenerate
+
+
+class WindowHullTestCase(unittest.TestCase):
+
+    def test_convex_hull(self):
+        # prepare: a square with points inside and on its edges
+        points = [(0, 0), (2, 0), (2, 2), (0, 2), (1, 1), (1, 0), (0, 0)]
+
+        # execute
+        actual = convex_hull(points)
+
+        # verify: counterclockwise, without collinear and duplicate points
+        self.assertEqual([(0, 0), (2, 0), (2, 2), (0, 2)], actual)
+        self.assertEqual(math.hypot(2, 2), hull_diameter(actual))
+
+    def test_is_degenerate(self):
+        # prepare: a segment, a thin triangle and a square
+        segment = convex_hull([(0, 0), (1, 1), (2, 2)])
+        thin = convex_hull([(0, 0), (100, 0), (50, 1)])
+        square = convex_hull([(0, 0), (2, 0), (2, 2), (0, 2)])
+
+        # verify
+        self.assertTrue(is_degenerate(segment, 0.1))
+        self.assertTrue(is_degenerate(thin, 0.1))
+        self.assertFalse(is_degenerate(thin, 1e-3))
+        self.assertFalse(is_degenerate(square, 0.1))
+        self.assertFalse(is_degenerate([(1, 1)], 0.1))
+
+    def test_sliding_window(self):
+        """ The hull and diameter of the window are those of its points, for any sequence of push and pop. """
+        rng = random.Random(1)
+        for _ in range(100):
+            # prepare
+            sut = WindowHull()
+            window = []
+
+            for _ in range(200):
+                # execute
+                if rng.random() < 0.55 or not window:
+                    # rounded coordinates create duplicate and collinear points
+                    point = (round(rng.gauss(0, 50), rng.choice([0, 6])), round(rng.gauss(0, 50), rng.choice([0, 6])))
+                    sut.push(*point)
+                    window.append(point)
+                elif rng.random() < 0.95:
+                    sut.pop()
+                    window.pop(0)
+                else:
+                    sut.clear()
+                    window = []
+
+                # verify
+                self.assertEqual(len(window), len(sut))
+                if window and rng.random() < 0.3:
+                    self.assertEqual(convex_hull(window), sut.hull())
+                    expected = max((math.dist(a, b) for a, b in itertools.combinations(window, 2)), default=0)
+                    self.assertAlmostEqual(expected, sut.diameter(), places=9)
+
+    def test_pop_empty(self):
+        with self.assertRaises(IndexError):
+            WindowHull().pop()
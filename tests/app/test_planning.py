@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+
+from app.planning import ExecutionPlan, ExecutionPlanner, IN_MEMORY, MAP_FULL, MAP_SIMPLIFIED, MAP_SKIPPED, \
+    MAP_STOPS_ONLY, MEMORY_BUDGET_ENV, MERGED, WINDOWED, get_memory_budget, record_peak, reset_peak
+
+
+class ExecutionPlannerTestCase(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        os.environ.pop(MEMORY_BUDGET_ENV, None)
+
+    def test_memory_budget(self):
+        # prepare
+        os.environ[MEMORY_BUDGET_ENV] = '512'
+
+        # execute / verify
+        self.assertEqual(512_000_000, get_memory_budget())
+        # the app configuration overrides the environment
+        self.assertEqual(100_000_000, get_memory_budget(100))
+        del os.environ[MEMORY_BUDGET_ENV]
+        self.assertIsNone(get_memory_budget())
+
+    def test_without_budget(self):
+        # prepare
+        sut = ExecutionPlanner(None)
+
+        # execute
+        plan = sut.plan([10 ** 8], bytes_per_point=500, transform=True)
+        sut.plan_map(plan, stop_count=10 ** 6, segment_point_count=10 ** 9)
+
+        # verify
+        self.assertEqual((IN_MEMORY, MAP_FULL, 1), (plan.strategy, plan.map_strategy, plan.map_step))
+
+    def test_strategies(self):
+        # prepare: 10 trajectories of 100000 observations
+        point_counts = [100_000] * 10
+        sut = ExecutionPlanner(2_000_000_000)
+
+        # execute
+        in_memory = sut.plan(point_counts, bytes_per_point=500, transform=True)
+        windowed = sut.plan(point_counts, bytes_per_point=1000, transform=True)
+
+        # verify
+        self.assertEqual(IN_MEMORY, in_memory.strategy)
+        self.assertEqual(WINDOWED, windowed.strategy)
+        self.assertLessEqual(windowed.estimated_bytes, sut.budget_bytes)
+
+    def test_segments(self):
+        """ The segments after the stops of a trajectory overlap, they are planned with their observations. """
+        # prepare: 10 stops in a trajectory of 100000 observations, each segment with 50000 observations
+        sut = ExecutionPlanner(400_000_000)
+        plan = sut.plan([100_000], bytes_per_point=500, transform=False)
+        detection_bytes = plan.estimated_bytes
+
+        # execute
+        with self.assertLogs(level='WARNING'):
+            sut.plan_segments(plan, segment_point_count=10 * 50_000, coordinate_point_count=100_000)
+
+        # verify: the segments exceed the budget, not the trajectory
+        self.assertEqual(detection_bytes + 10 * 50_000 * (500 + 100) + 100_000 * 16, plan.estimated_bytes)
+
+    def test_merge(self):
+        # prepare
+        sut = ExecutionPlanner(100_000_000)
+
+        # execute
+        plan = sut.plan_merge(input_bytes=40_000_000, segment_bytes=10_000_000)
+        sut.plan_map(plan, stop_count=100, segment_point_count=10_000)
+
+        # verify: the map is planned within the memory left by the input data and the segments
+        self.assertEqual((MERGED, MAP_FULL), (plan.strategy, plan.map_strategy))
+        self.assertEqual(50_000_000 + 100 * 12000 + 10_000 * 300, plan.estimated_bytes)
+
+    def test_map_strategies(self):
+        # prepare
+        sut = ExecutionPlanner(100_000_000)
+
+        def plan_map(stop_count: int, segment_point_count: int):
+            plan = sut.plan([10_000], bytes_per_point=500, transform=False)
+            sut.plan_map(plan, stop_count, segment_point_count)
+            return plan
+
+        # execute
+        full = plan_map(100, 10_000)
+        simplified = plan_map(100, 1_000_000)
+        # the stops fit into the budget, their segments would not even with two observations each
+        stops_only = plan_map(7000, 1_000_000)
+        skipped = plan_map(10_000, 1_000_000)
+        # the stop detection alone exceeds the budget
+        without_stops = ExecutionPlanner(1_000_000).plan([10_000], bytes_per_point=500, transform=False)
+        ExecutionPlanner(1_000_000).plan_map(without_stops, stop_count=0, segment_point_count=0)
+
+        # verify
+        self.assertEqual(MAP_FULL, full.map_strategy)
+        self.assertEqual(MAP_SIMPLIFIED, simplified.map_strategy)
+        self.assertLessEqual(simplified.estimated_bytes, sut.budget_bytes)
+        self.assertEqual(MAP_STOPS_ONLY, stops_only.map_strategy)
+        self.assertEqual(MAP_SKIPPED, skipped.map_strategy)
+        # the map without stops is not skipped, it reports that there are no stops
+        self.assertEqual(MAP_FULL, without_stops.map_strategy)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'the peak memory is only reset on Linux')
+    def test_peak_of_run(self):
+        """ The peak of a run does not include the peak of an earlier run of the process. """
+        # prepare: an earlier run allocating 100 MB
+        earlier = ExecutionPlan(IN_MEMORY, peak_of_run=reset_peak())
+        allocated = bytearray(b'x') * 100_000_000
+        record_peak(earlier)
+        del allocated
+
+        # execute
+        plan = ExecutionPlan(IN_MEMORY, peak_of_run=reset_peak())
+        record_peak(plan)
+
+        # verify
+        self.assertTrue(plan.peak_of_run)
+        self.assertGreater(earlier.peak_bytes, 100_000_000)
+        self.assertLess(plan.peak_bytes, earlier.peak_bytes - 50_000_000)
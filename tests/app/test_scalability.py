@@ -0,0 +1,163 @@
+import os
+import statistics
+import time
+import tracemalloc
+import unittest
+from datetime import timedelta
+from typing import Callable, Tuple
+
+from app.app import App
+from sdk.moveapps_io import MoveAppsIo
+from tests.app.synthetic_trajectories import SyntheticTrajectories
+from tests.config.definitions import ROOT_DIR
+
+CONFIG = {
+    "min_duration_hours": 12,
+    "max_diameter_meters": 100,
+    "final_stops_only": False,
+    "return_data": "trajectories"
+}
+
+# factor between the measured growth and the growth of the declared complexity that is still accepted
+# (for 4 times the input, linear growth is accepted up to 8 times the runtime, quadratic growth would be 16 times)
+TOLERANCE = 2.0
+
+# the runtime is the median of several runs, single runs are too noisy on shared machines
+REPETITIONS = 5
+
+
+class ScalabilityTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        os.environ['APP_ARTIFACTS_DIR'] = os.path.join(ROOT_DIR, 'tests/resources/output')
+        # imports and caches are warmed up before measuring
+        data, _ = SyntheticTrajectories(individuals=1, points_per_individual=100, stops_per_individual=1,
+                                        stop_duration=timedelta(hours=24)).generate()
+        App(moveapps_io=MoveAppsIo()).execute(data=data, config=CONFIG)
+
+    @staticmethod
+    def measure(run: Callable[[], None]) -> Tuple[float, int]:
+        """ :return: the median runtime in seconds and the peak of the allocated memory in bytes """
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        runtimes = []
+        for _ in range(REPETITIONS):
+            started = time.perf_counter()
+            run()
+            runtimes.append(time.perf_counter() - started)
+        return statistics.median(runtimes), peak
+
+    def assert_linear(self, small: Tuple[float, int], large: Tuple[float, int], growth: float):
+        """ Checks that runtime and memory grow at most linearly with the input, by `growth`. """
+        self.assertLess(large[0] / small[0], growth * TOLERANCE, f'runtime {small[0]:.2f}s -> {large[0]:.2f}s')
+        self.assertLess(large[1] / small[1], growth * TOLERANCE, f'memory {small[1]} -> {large[1]} bytes')
+
+    def test_planted_stops_recovered(self):
+        for crs in ['EPSG:4326', 'EPSG:32633']:
+            # prepare
+            data, planted = SyntheticTrajectories(individuals=3, points_per_individual=400, stops_per_individual=3,
+                                                  stop_duration=timedelta(hours=24), crs=crs).generate()
+            sut = App(moveapps_io=MoveAppsIo())
+
+            # execute
+            actual = sut.execute(data=data, config=CONFIG)
+
+            # verify
+            self.assertTrue(all(stop.diameter_m < CONFIG['max_diameter_meters'] for stop in planted))
+            self.assertEqual(sorted((stop.traj_id, stop.start_time, stop.end_time) for stop in planted),
+                             sorted(zip(sut.all_stop_points['traj_id'], sut.all_stop_points['start_time'],
+                                        sut.all_stop_points['end_time'])))
+            # a segment after each stop
+            self.assertEqual(len(planted), len(actual.trajectories))
+
+    def test_final_stops_recovered(self):
+        # prepare
+        data, planted = SyntheticTrajectories(individuals=3, points_per_individual=400, stops_per_individual=3,
+                                              stop_duration=timedelta(hours=24)).generate()
+        sut = App(moveapps_io=MoveAppsIo())
+
+        # execute
+        sut.execute(data=data, config={**CONFIG, "final_stops_only": True})
+
+        # verify
+        final_stops = {stop.traj_id: stop.start_time for stop in planted}  # planted in time order
+        self.assertEqual(final_stops, dict(zip(sut.final_stop_points['traj_id'], sut.final_stop_points['start_time'])))
+
+    @staticmethod
+    def segment_points(sut: App) -> int:
+        """ :return: the number of points of the segments after the stops of the last run """
+        return sum(len(segment) for segment in sut.map_segments)
+
+    def test_execute_scales_with_points(self):
+        """ Longer trajectories: runtime and memory of a run are linear in the number of points and the points of
+        the returned segments after the stops. The segments of a trajectory overlap, with all stops they grow with
+        the number of stops times the number of points.
+        """
+        # prepare
+        def run(points: int) -> Tuple[Callable[[], None], int]:
+            data, _ = SyntheticTrajectories(individuals=1, points_per_individual=points,
+                                            stops_per_individual=points // 250,
+                                            stop_duration=timedelta(hours=24)).generate()
+            sut = App(moveapps_io=MoveAppsIo())
+            sut.execute(data=data, config=CONFIG)
+            return lambda: App(moveapps_io=MoveAppsIo()).execute(data=data, config=CONFIG), \
+                points + self.segment_points(sut)
+
+        def run_without_segments(points: int) -> Callable[[], None]:
+            data, _ = SyntheticTrajectories(individuals=1, points_per_individual=points,
+                                            stops_per_individual=points // 250,
+                                            stop_duration=timedelta(hours=24)).generate()
+            config = {**CONFIG, "return_data": "input_data", "display_trajectories_after_stops": False}
+            return lambda: App(moveapps_io=MoveAppsIo()).execute(data=data, config=config)
+
+        # execute
+        small, small_size = run(500)
+        large, large_size = run(2000)
+        small, large = self.measure(small), self.measure(large)
+        small_without_segments = self.measure(run_without_segments(500))
+        large_without_segments = self.measure(run_without_segments(2000))
+
+        # verify: the segments grow faster than the points
+        self.assertGreater(large_size / small_size, 8)
+        self.assert_linear(small, large, growth=large_size / small_size)
+        self.assert_linear(small_without_segments, large_without_segments, growth=4)
+
+    def test_execute_scales_with_individuals(self):
+        """ More individuals: runtime and memory of a run are linear in the number of individuals. """
+        # prepare
+        def run(individuals: int) -> Callable[[], None]:
+            data, _ = SyntheticTrajectories(individuals=individuals, points_per_individual=300,
+                                            stop_duration=timedelta(hours=24)).generate()
+            return lambda: App(moveapps_io=MoveAppsIo()).execute(data=data, config=CONFIG)
+
+        # execute
+        small = self.measure(run(1))
+        large = self.measure(run(4))
+
+        # verify
+        self.assert_linear(small, large, growth=4)
+
+    def test_plot_scales_with_stops(self):
+        """ The map is linear in the number of stops and the points of the segments after them. """
+        # prepare
+        def run(points: int) -> Tuple[Callable[[], None], int]:
+            data, _ = SyntheticTrajectories(individuals=1, points_per_individual=points,
+                                            stops_per_individual=points // 250,
+                                            stop_duration=timedelta(hours=24)).generate()
+            sut = App(moveapps_io=MoveAppsIo())
+            sut.execute(data=data, config=CONFIG)
+            return lambda: sut.generate_plot(), len(sut.all_stop_points) + self.segment_points(sut)
+
+        # execute
+        small, small_size = run(500)
+        large, large_size = run(2000)
+        small, large = self.measure(small), self.measure(large)
+
+        # verify: all stops, their segments grow faster than the points
+        self.assertGreater(large_size / small_size, 8)
+        self.assert_linear(small, large, growth=large_size / small_size)
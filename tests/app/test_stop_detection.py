@@ -0,0 +1,159 @@
+import os
+import unittest
+from datetime import timedelta
+
+import geopandas as gpd
+import movingpandas as mpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from app.stop_detection import FinalStopDetector, StopDetector
+from tests.config.definitions import ROOT_DIR
+
+
+def random_trajectory(seed: int, crs: str) -> mpd.Trajectory:
+    """ A random walk switching between resting, slow and fast movement. """
+    rng = np.random.default_rng(seed)
+    length = int(rng.integers(5, 300))
+    steps = np.array([5, 60, 400])[np.cumsum(rng.random(length) < 0.08) % 3]
+    xs = np.cumsum(rng.normal(0, steps))
+    ys = np.cumsum(rng.normal(0, steps))
+    if crs == 'EPSG:4326':
+        geometry = shapely.points(10 + xs / 1e5, 50 + ys / 1e5)
+    else:
+        geometry = shapely.points(5e5 + xs, 5e6 + ys)
+    times = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.cumsum(rng.integers(10, 120, length)), unit='min')
+    df = gpd.GeoDataFrame({'fix': range(length)}, geometry=geometry, index=pd.DatetimeIndex(times, name='t'), crs=crs)
+    return mpd.Trajectory(df, seed)
+
+
+def thin_trajectory(seed: int) -> mpd.Trajectory:
+    """ A random walk back and forth along a line, with fixes rounded to 0.1 m: its windows are (nearly) collinear. """
+    rng = np.random.default_rng(seed)
+    length = 300
+    along = np.cumsum(rng.choice([-1, 0, 1, 2], length) * rng.uniform(0, 8, length))
+    across = rng.choice([0, 0, 0.1], length) * rng.normal(size=length)
+    angle = rng.uniform(0, np.pi)
+    xs = np.round(5e5 + along * np.cos(angle) - across * np.sin(angle), 1)
+    ys = np.round(5e6 + along * np.sin(angle) + across * np.cos(angle), 1)
+    times = pd.date_range('2020-01-01', periods=length, freq='5min', name='t')
+    df = gpd.GeoDataFrame({'fix': range(length)}, geometry=shapely.points(xs, ys), index=times, crs='EPSG:32633')
+    return mpd.Trajectory(df, seed)
+
+
+def collinear_trajectory() -> mpd.Trajectory:
+    """ A stop of three collinear fixes: their minimum rotated rectangle is not the rectangle of their hull. """
+    geometry = shapely.points([(499837.9, 5000055), (499827.7, 5000060), (499848.1, 5000050), (501000, 5001000)])
+    times = pd.date_range('2020-01-01', periods=4, freq='20min', name='t')
+    df = gpd.GeoDataFrame({'fix': range(4)}, geometry=geometry, index=times, crs='EPSG:32633')
+    return mpd.Trajectory(df, 1)
+
+
+class FinalStopDetectorTestCase(unittest.TestCase):
+
+    def assert_final_stop(self, trajectory: mpd.Trajectory, max_diameter: float, min_duration: timedelta):
+        # execute
+        expected = mpd.TrajectoryStopDetector(trajectory).get_stop_time_ranges(max_diameter, min_duration)
+        actual = FinalStopDetector(trajectory).get_stop_time_ranges(max_diameter, min_duration)
+
+        # verify
+        self.assertEqual([(r.t_0, r.t_n) for r in expected[-1:]], [(r.t_0, r.t_n) for r in actual],
+                         f'trajectory {trajectory.id}, {max_diameter} m, {min_duration}')
+
+    def test_input2(self):
+        """ The final stop is the last stop of the forward scan. """
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+
+        for trajectory in data.trajectories:
+            for max_diameter, hours in [(100, 6), (100, 30), (100, 120), (500, 24)]:
+                self.assert_final_stop(trajectory, max_diameter, timedelta(hours=hours))
+
+    def test_random_trajectories(self):
+        for seed in range(30):
+            for crs in ['EPSG:4326', 'EPSG:32633']:
+                for max_diameter, hours in [(50, 1), (100, 2), (200, 5)]:
+                    self.assert_final_stop(random_trajectory(seed, crs), max_diameter, timedelta(hours=hours))
+
+    def test_collinear_window(self):
+        self.assert_final_stop(collinear_trajectory(), 20, timedelta(minutes=30))
+
+    def test_thin_trajectories(self):
+        for seed in range(100, 150):
+            for max_diameter, hours in [(20, 0.5), (50, 1)]:
+                self.assert_final_stop(thin_trajectory(seed), max_diameter, timedelta(hours=hours))
+
+    def test_stop_points(self):
+        """ The final stop point is the last stop point of the forward scan. """
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        trajectory = data.trajectories[0]
+
+        # execute
+        expected = mpd.TrajectoryStopDetector(trajectory).get_stop_points(max_diameter=100,
+                                                                         min_duration=timedelta(hours=30))
+        actual = FinalStopDetector(trajectory).get_stop_points(max_diameter=100, min_duration=timedelta(hours=30))
+
+        # verify
+        pd.testing.assert_frame_equal(expected.iloc[[-1]], actual)
+
+    def test_no_stop(self):
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+
+        # execute
+        actual = FinalStopDetector(data.trajectories[1]).get_stop_points(max_diameter=100,
+                                                                        min_duration=timedelta(hours=120))
+
+        # verify
+        self.assertTrue(actual.empty)
+
+
+class StopDetectorTestCase(unittest.TestCase):
+
+    def assert_stops(self, trajectory: mpd.Trajectory, max_diameter: float, min_duration: timedelta):
+        # execute
+        expected = mpd.TrajectoryStopDetector(trajectory).get_stop_time_ranges(max_diameter, min_duration)
+        actual = StopDetector(trajectory).get_stop_time_ranges(max_diameter, min_duration)
+
+        # verify
+        self.assertEqual([(r.t_0, r.t_n) for r in expected], [(r.t_0, r.t_n) for r in actual],
+                         f'trajectory {trajectory.id}, {max_diameter} m, {min_duration}')
+
+    def test_input2(self):
+        """ The stops are the stops of the movingpandas detector. """
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+
+        for trajectory in data.trajectories:
+            for max_diameter, hours in [(100, 6), (100, 30), (500, 24)]:
+                self.assert_stops(trajectory, max_diameter, timedelta(hours=hours))
+
+    def test_random_trajectories(self):
+        for seed in range(30):
+            for crs in ['EPSG:4326', 'EPSG:32633']:
+                for max_diameter, hours in [(50, 1), (100, 2), (200, 5)]:
+                    self.assert_stops(random_trajectory(seed, crs), max_diameter, timedelta(hours=hours))
+
+    def test_collinear_window(self):
+        """ The collinear fixes are a stop, as for the movingpandas detector. """
+        self.assert_stops(collinear_trajectory(), 20, timedelta(minutes=30))
+
+    def test_thin_trajectories(self):
+        for seed in range(100, 150):
+            for max_diameter, hours in [(20, 0.5), (50, 1)]:
+                self.assert_stops(thin_trajectory(seed), max_diameter, timedelta(hours=hours))
+
+    def test_stop_points(self):
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        trajectory = data.trajectories[0]
+
+        # execute
+        expected = mpd.TrajectoryStopDetector(trajectory).get_stop_points(max_diameter=100,
+                                                                         min_duration=timedelta(hours=30))
+        actual = StopDetector(trajectory).get_stop_points(max_diameter=100, min_duration=timedelta(hours=30))
+
+        # verify
+        pd.testing.assert_frame_equal(expected, actual)
@@ -0,0 +1,90 @@
+import os
+import unittest
+from datetime import timedelta
+
+import pandas as pd
+import movingpandas as mpd
+
+from app.stop_detection import FinalStopDetector
+from app.streaming import Fix, QueueSource, StreamingStopDetector, STOP_CONFIRMED, STOP_ENDED, detect, replay
+from tests.config.definitions import ROOT_DIR
+
+
+def hourly_fixes(individual: str, start: pd.Timestamp, positions: list) -> list:
+    return [Fix(individual, start + pd.Timedelta(hours=i), x, y) for i, (x, y) in enumerate(positions)]
+
+
+class StreamingStopDetectorTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # projected coordinates in meters
+        self.sut = StreamingStopDetector({"min_duration_hours": 24, "max_diameter_meters": 100}, crs='EPSG:32633')
+        self.start = pd.Timestamp('2020-01-01')
+
+    def test_stop_confirmed_and_ended(self):
+        # prepare: moving for 5 hours, resting for 30 hours, moving again
+        moving = [(500000 + 1000 * i, 5000000) for i in range(5)]
+        resting = [(505000 + (i % 3) * 10, 5000000 + (i % 2) * 10) for i in range(30)]
+        fixes = hourly_fixes('a', self.start, moving + resting + [(510000, 5000000)])
+
+        # execute
+        events = [(i, event) for i, fix in enumerate(fixes) for event in self.sut.push(fix)]
+
+        # verify
+        self.assertEqual([STOP_CONFIRMED, STOP_ENDED], [event.kind for _, event in events])
+        confirmed_at, confirmed = events[0]
+        # as soon as the individual rested for 24 hours
+        self.assertEqual(5 + 24, confirmed_at)
+        self.assertEqual(self.start + pd.Timedelta(hours=5), confirmed.start_time)
+        self.assertEqual(24 * 3600, confirmed.duration_s)
+        ended_at, ended = events[1]
+        self.assertEqual(len(fixes) - 1, ended_at)
+        self.assertEqual(29 * 3600, ended.duration_s)
+        self.assertAlmostEqual(505010, ended.x, places=3)
+
+    def test_bounded_window(self):
+        # prepare: a tag resting for a year
+        fixes = hourly_fixes('a', self.start, [(500000 + (i % 5), 5000000 + (i % 7)) for i in range(24 * 365)])
+
+        # execute
+        events = self.sut.push_batch('a', fixes)
+
+        # verify
+        self.assertEqual([STOP_CONFIRMED], [event.kind for event in events])
+        self.assertEqual({'a': 1}, self.sut.open_windows())
+
+    def test_individuals_and_order(self):
+        # prepare
+        fixes_a = hourly_fixes('a', self.start, [(500000, 5000000)] * 25)
+        fixes_b = hourly_fixes('b', self.start, [(500000 + 1000 * i, 5000000) for i in range(25)])
+
+        # execute
+        events = self.sut.push_batch('a', fixes_a[:20]) + self.sut.push_batch('b', fixes_b)
+        # an outdated fix is ignored
+        events += self.sut.push(fixes_a[3])
+        events += self.sut.push_batch('a', fixes_a[20:])
+
+        # verify
+        self.assertEqual([('a', STOP_CONFIRMED)], [(event.individual, event.kind) for event in events])
+
+    def test_queue_source(self):
+        """ The last confirmed stop of each individual starts with the final stop of the batch detection. """
+        # prepare
+        data: mpd.TrajectoryCollection = pd.read_pickle(os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle'))
+        sut = StreamingStopDetector({"min_duration_hours": 30, "max_diameter_meters": 100},
+                                    crs=data.trajectories[0].df.crs)
+        source = QueueSource(maxsize=100)
+
+        # execute
+        producer = source.feed(replay(data))
+        events = list(detect(source, sut))
+        producer.join()
+
+        # verify
+        latest_stops = {event.individual: event.start_time for event in events if event.kind == STOP_CONFIRMED}
+        final_stops = {}
+        for trajectory in data.trajectories:
+            for stop in FinalStopDetector(trajectory).get_stop_time_ranges(100, timedelta(hours=30)):
+                final_stops[str(trajectory.id)] = stop.t_0
+        self.assertEqual(final_stops, latest_stops)
+        self.assertTrue(all(event.latency_s >= 0 for event in events))
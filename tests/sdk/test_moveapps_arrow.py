@@ -0,0 +1,54 @@
+import os
+import tempfile
+from unittest import TestCase
+from tests.config.definitions import ROOT_DIR
+from sdk.moveapps_arrow import is_arrow_file, read_arrow, write_arrow
+from sdk.moveapps_sharding import with_trajectories
+import pandas as pd
+import movingpandas as mpd
+
+
+class TestMoveAppsArrow(TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'data.arrow')
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_is_arrow_file(self):
+        self.assertTrue(is_arrow_file('output.arrow'))
+        self.assertTrue(is_arrow_file('input.FEATHER'))
+        self.assertFalse(is_arrow_file('output.pickle'))
+        self.assertFalse(is_arrow_file(None))
+
+    def test_write_and_read(self):
+        # prepare
+        expected: mpd.TrajectoryCollection = pd.read_pickle(
+            os.path.join(ROOT_DIR, 'resources/samples/input3_LatLon.pickle'))
+
+        # execute
+        write_arrow(expected, self.path)
+        actual = read_arrow(self.path)
+
+        # verify
+        self.assertEqual([traj.id for traj in expected.trajectories], [traj.id for traj in actual.trajectories])
+        self.assertEqual(expected.get_traj_id_col(), actual.get_traj_id_col())
+        for expected_traj, actual_traj in zip(expected.trajectories, actual.trajectories):
+            self.assertEqual(expected_traj.crs, actual_traj.crs)
+            self.assertTrue(expected_traj.df.index.equals(actual_traj.df.index))
+            self.assertTrue(expected_traj.df.geometry.geom_equals(actual_traj.df.geometry).all())
+            self.assertTrue(expected_traj.df.astype(object).equals(actual_traj.df.astype(object)))
+
+    def test_write_and_read_empty(self):
+        # prepare
+        expected = with_trajectories(pd.read_pickle(
+            os.path.join(ROOT_DIR, 'resources/samples/input3_LatLon.pickle')), [])
+
+        # execute
+        write_arrow(expected, self.path)
+        actual = read_arrow(self.path)
+
+        # verify
+        self.assertEqual(0, len(actual.trajectories))
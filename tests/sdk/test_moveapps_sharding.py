@@ -0,0 +1,74 @@
+import os
+import tempfile
+from unittest import TestCase
+from tests.config.definitions import ROOT_DIR
+from sdk.moveapps_arrow import write_arrow
+from sdk.moveapps_sharding import split_source_file, load_shards, get_shard_environment
+import pandas as pd
+
+
+class TestMoveAppsSharding(TestCase):
+
+    def setUp(self) -> None:
+        self.source_file = os.path.join(ROOT_DIR, 'tests/resources/app/input2.pickle')
+        self.shard_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.shard_dir.cleanup()
+
+    def test_split_source_file(self):
+        # execute
+        actual = split_source_file(self.source_file, 2, self.shard_dir.name)
+
+        # verify
+        self.assertEqual(2, len(actual))
+        shard_ids = [
+            [str(traj.id) for traj in pd.read_pickle(get_shard_environment(shard)['SOURCE_FILE']).trajectories]
+            for shard in actual
+        ]
+        # largest trajectory alone, the two smaller ones together
+        self.assertEqual([['742'], ['746', '749']], shard_ids)
+
+    def test_split_arrow_source_file(self):
+        # prepare
+        source_file = os.path.join(self.shard_dir.name, 'input2.arrow')
+        write_arrow(pd.read_pickle(self.source_file), source_file)
+
+        # execute
+        actual = split_source_file(source_file, 2, self.shard_dir.name)
+
+        # verify
+        shard_ids = [
+            [str(traj.id) for traj in pd.read_pickle(get_shard_environment(shard)['SOURCE_FILE']).trajectories]
+            for shard in actual
+        ]
+        self.assertEqual([['742'], ['746', '749']], shard_ids)
+
+    def test_split_source_file_more_shards_than_trajectories(self):
+        # execute
+        actual = split_source_file(self.source_file, 10, self.shard_dir.name)
+
+        # verify
+        self.assertEqual(3, len(actual))
+
+    def test_load_shards_keeps_input_order(self):
+        # prepare
+        expected = pd.read_pickle(self.source_file)
+        shards = split_source_file(self.source_file, 2, self.shard_dir.name)
+        for shard in shards:
+            pd.to_pickle(None, get_shard_environment(shard)['OUTPUT_FILE'])
+
+        # execute
+        actual, artifact_dirs = load_shards(self.shard_dir.name)
+
+        # verify
+        self.assertEqual(shards, artifact_dirs)
+        self.assertEqual([traj.id for traj in expected.trajectories], [traj.id for traj in actual.trajectories])
+
+    def test_load_shards_incomplete(self):
+        # prepare
+        split_source_file(self.source_file, 2, self.shard_dir.name)
+
+        # execute
+        with self.assertRaises(FileNotFoundError):
+            load_shards(self.shard_dir.name)
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+from sdk.moveapps_spec import hook_impl
+from sdk.moveapps_worker import MoveAppsWorker
+import pandas as pd
+
+
+class CountingApp:
+
+    def __init__(self):
+        self.runs = 0
+
+    @hook_impl
+    def execute(self, data, config):
+        self.runs += 1
+        return {'data': data, 'config': config, 'runs': self.runs}
+
+
+class TestMoveAppsWorker(TestCase):
+
+    def setUp(self) -> None:
+        self.job_dir = tempfile.TemporaryDirectory()
+        self.created_hooks = []
+        self.sut = MoveAppsWorker(hook_factory=self.create_hooks, job_dir=self.job_dir.name)
+
+    def tearDown(self) -> None:
+        self.job_dir.cleanup()
+
+    def create_hooks(self):
+        hook = CountingApp()
+        self.created_hooks.append(hook)
+        return [hook]
+
+    def add_job(self, name: str, job: dict) -> None:
+        with open(os.path.join(self.job_dir.name, 'pending', f'{name}.json'), 'w') as f:
+            json.dump(job, f)
+
+    def test_run_jobs(self):
+        # prepare
+        source_file = os.path.join(self.job_dir.name, 'input.pickle')
+        pd.to_pickle('input', source_file)
+        artifacts_a = os.path.join(self.job_dir.name, 'a')
+        self.add_job('a', {'source_file': source_file, 'artifacts_dir': artifacts_a, 'config': {'a': 1}})
+        artifacts_b = os.path.join(self.job_dir.name, 'b')
+        self.add_job('b', {'source_file': source_file, 'artifacts_dir': artifacts_b, 'config': {'b': 2}})
+
+        # execute
+        actual = self.sut.run(stop_when_idle=True)
+
+        # verify
+        self.assertEqual(2, actual)
+        self.assertEqual(['a.json', 'b.json'], sorted(os.listdir(os.path.join(self.job_dir.name, 'done'))))
+        self.assertEqual(
+            {'data': 'input', 'config': {'a': 1}, 'runs': 1},
+            pd.read_pickle(os.path.join(artifacts_a, 'output.pickle'))
+        )
+        # every job runs with a new hook
+        self.assertEqual(
+            {'data': 'input', 'config': {'b': 2}, 'runs': 1},
+            pd.read_pickle(os.path.join(artifacts_b, 'output.pickle'))
+        )
+        self.assertEqual(2, len(self.created_hooks))
+
+    def test_run_failing_job(self):
+        # prepare
+        artifacts_dir = os.path.join(self.job_dir.name, 'failing')
+        self.add_job('failing', {'source_file': os.path.join(self.job_dir.name, 'missing.pickle'),
+                                 'artifacts_dir': artifacts_dir})
+
+        # execute
+        actual = self.sut.run(stop_when_idle=True)
+
+        # verify
+        self.assertEqual(1, actual)
+        self.assertEqual(['failing.json'], os.listdir(os.path.join(self.job_dir.name, 'failed')))
+        self.assertTrue(os.path.exists(os.path.join(artifacts_dir, 'error.txt')))
+
+    def test_job_claimed_by_another_worker(self):
+        """ A job that another worker claims between listing and claiming the pending jobs is skipped. """
+        # prepare
+        source_file = os.path.join(self.job_dir.name, 'input.pickle')
+        pd.to_pickle('input', source_file)
+        self.add_job('a', {'source_file': source_file, 'artifacts_dir': os.path.join(self.job_dir.name, 'a')})
+        pending_dir = os.path.join(self.job_dir.name, 'pending')
+        listdir = os.listdir
+
+        def listdir_with_claimed_job(path):
+            # the other worker moved `claimed.json` to `running` after it was listed
+            return listdir(path) + ['claimed.json'] if path == pending_dir else listdir(path)
+
+        # execute
+        with mock.patch('sdk.moveapps_worker.os.listdir', side_effect=listdir_with_claimed_job):
+            actual = self.sut.run(stop_when_idle=True)
+
+        # verify
+        self.assertEqual(1, actual)
+        self.assertEqual(['a.json'], os.listdir(os.path.join(self.job_dir.name, 'done')))
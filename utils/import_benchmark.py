@@ -0,0 +1,44 @@
+import re
+import subprocess
+import sys
+from typing import Dict
+
+from tests.config.definitions import ROOT_DIR
+
+# the import phases of an app run, each including the previous ones
+PHASES = {
+    'startup': 'from app.app import App; from sdk.moveapps_io import MoveAppsIo; '
+               'App(moveapps_io=MoveAppsIo()).validate_config({})',
+    'detection': 'import pandas, geopandas, movingpandas',
+    'plot': 'import folium',
+}
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$')
+
+
+class ImportBenchmark:
+
+    def measure(self, code: str) -> Dict[str, int]:
+        """ Measures the imports of a python snippet with `-X importtime`.
+        :param code: the python code to run in a fresh interpreter
+        :return: the cumulative import time in microseconds of each top level import
+        """
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        top_level = {}
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match and len(match.group(3)) == 1:
+                top_level[match.group(4)] = int(match.group(2))
+        return top_level
+
+    def run(self, repetitions: int = 5) -> None:
+        code = ''
+        for phase, phase_code in PHASES.items():
+            code = f'{code}; {phase_code}' if code else phase_code
+            totals = sorted(sum(self.measure(code).values()) for _ in range(repetitions))
+            print(f'{phase:<10} median import time: {totals[len(totals) // 2] / 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    ImportBenchmark().run()
@@ -0,0 +1,56 @@
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from app.streaming import QueueSource, StreamingStopDetector, detect, replay
+from sdk.moveapps_arrow import is_arrow_file, read_arrow
+
+
+class StreamReplay:
+
+    def load(self):
+        """ Loads the SOURCE_FILE and the app configuration of the `.env` file. """
+        import pandas as pd
+
+        load_dotenv()
+        source_file = os.environ['SOURCE_FILE']
+        data = read_arrow(source_file) if is_arrow_file(source_file) else pd.read_pickle(source_file)
+        with open(os.environ['CONFIGURATION_FILE']) as f:
+            config = json.load(f)
+        return data, config
+
+    def run(self, interval_s: float = 0.0) -> None:
+        """ Replays the fixes of the SOURCE_FILE in time order through a queue and reports the stop events and their
+        latency (from receiving the triggering fix to emitting the event).
+        :param interval_s: seconds between two fixes, 0 replays as fast as possible
+        """
+        data, config = self.load()
+        crs = data.trajectories[0].df.crs if data.trajectories else None
+        detector = StreamingStopDetector(config, crs)
+        source = QueueSource(maxsize=1000)
+
+        started = time.perf_counter()
+        source.feed(replay(data), interval_s=interval_s)
+        latencies = []
+        for event in detect(source, detector):
+            latencies.append(event.latency_s)
+            print(f'{event.kind:<10} {event.individual} {event.start_time} - {event.end_time} '
+                  f'({event.duration_s / 3600:.1f} h) at {event.x:.5f} {event.y:.5f}')
+        elapsed = time.perf_counter() - started
+
+        fixes = sum(len(trajectory.df) for trajectory in data.trajectories)
+        print(f'{fixes} fixes in {elapsed:.2f}s ({fixes / elapsed:.0f} fixes/s), {len(latencies)} events')
+        if latencies:
+            latencies.sort()
+            print(f'latency median {latencies[len(latencies) // 2] * 1000:.2f} ms, '
+                  f'max {latencies[-1] * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replays the SOURCE_FILE as stream of fixes through the live alerting.')
+    parser.add_argument('--interval', type=float, default=0.0, help='seconds between two fixes')
+    StreamReplay().run(interval_s=parser.parse_args().interval)